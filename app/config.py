@@ -15,16 +15,120 @@ class Settings(BaseSettings):
     # SQLite database URL
     SQLALCHEMY_DATABASE_URL: str = "sqlite:///./database.db"
     
+    # Per-account shards for chats, conversations and messages. Empty keeps
+    # everything in SQLALCHEMY_DATABASE_URL; only ever append new URLs.
+    DATABASE_SHARD_URLS: List[str] = []
+    
+    # Connection pool sizing
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    
+    # SQLite storage profile
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE: int = -65536  # Negative values are KiB, so 64 MiB
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_OPTIMIZE_INTERVAL_SECONDS: int = 60 * 60
+    
+    # Message bodies at least this many characters long are stored compressed
+    # (0 disables). Trained dictionaries are read from MESSAGE_COMPRESSION_DICT_DIR.
+    MESSAGE_COMPRESSION_THRESHOLD: int = 1024
+    MESSAGE_COMPRESSION_LEVEL: int = 6
+    MESSAGE_COMPRESSION_DICT_DIR: Optional[str] = None
+    
     # CORS settings
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
     
     # Redis settings (if needed)
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # Cache settings; CHAT_CACHE_BACKEND is "memory" or "redis"
+    CACHE_EXPIRE_SECONDS: int = 300
+    CHAT_CACHE_BACKEND: str = "memory"
+    CHAT_CACHE_MAX_ENTRIES: int = 10000
+    
     # Groq API settings
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "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")
     GROQ_MODEL: str = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
     
+    # LLM_BACKEND "fake" swaps Groq for a local stub with the delays below
+    LLM_BACKEND: str = "groq"
+    FAKE_LLM_LATENCY_MS: int = 300
+    FAKE_LLM_TOKENS_PER_SECOND: float = 50.0
+    FAKE_LLM_RESPONSE_TOKENS: int = 60
+    
+    # Idempotency settings
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60
+    
+    # Group-commit settings for message inserts
+    MESSAGE_BATCH_MAX_ROWS: int = 256
+    MESSAGE_BATCH_INTERVAL_MS: int = 5
+    
+    # Response compression; only complete bodies of these types are gzipped
+    GZIP_MINIMUM_SIZE: int = 1024
+    GZIP_COMPRESS_LEVEL: int = 6
+    GZIP_CONTENT_TYPES: List[str] = ["application/json", "text/"]
+    
+    # Rows per read batch and per import transaction for NDJSON transfers
+    TRANSFER_BATCH_ROWS: int = 5000
+    # Longest NDJSON line accepted by /chats/import
+    TRANSFER_MAX_LINE_BYTES: int = 8 * 1024 * 1024
+    
+    # Report per-request SQL statement counts and DB time in X-DB-* headers
+    QUERY_STATS_HEADERS: bool = False
+    
+    # Negotiate permessage-deflate on WebSocket connections
+    WS_PER_MESSAGE_DEFLATE: bool = True
+    
+    # WebSocket lifecycle: protocol-level pings detect dead peers; sockets that
+    # send nothing (not even a {"type": "ping"} frame) within the idle timeout,
+    # or that stall a broadcast past the send timeout, are closed. Keep the idle
+    # timeout well above the frontend's 30s heartbeat.
+    WS_PING_INTERVAL_SECONDS: float = 20.0
+    WS_PING_TIMEOUT_SECONDS: float = 20.0
+    WS_IDLE_TIMEOUT_SECONDS: float = 120.0
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+    # Sockets per process; further connections are closed with 1013 (try again later)
+    WS_MAX_CONNECTIONS: int = 20000
+    
+    # Graceful drain on SIGTERM: time for in-flight generations to finish before
+    # they are checkpointed, extra time to persist them, and the range of the
+    # randomized reconnect delay sent to clients
+    DRAIN_TIMEOUT_SECONDS: float = 20.0
+    DRAIN_GRACE_SECONDS: float = 5.0
+    RECONNECT_MIN_MS: int = 1000
+    RECONNECT_MAX_MS: int = 15000
+    
+    # Fraction of requests traced (0 disables tracing) and where spans go ("log", "memory")
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_EXPORTERS: List[str] = ["log"]
+    
+    # Event-loop lag sampling; lag above LOOP_LAG_WARN_MS is logged
+    LOOP_LAG_INTERVAL_MS: int = 500
+    LOOP_LAG_WARN_MS: int = 100
+    
+    # Debug mode: log the stack of any callback holding the loop longer than the threshold
+    LOOP_BLOCKING_DETECTOR: bool = False
+    LOOP_BLOCKING_THRESHOLD_MS: int = 200
+    
+    # Users allowed to call the /admin endpoints
+    ADMIN_USERNAMES: List[str] = []
+    
+    # Static bearer token for the Prometheus scraper; /metrics is off while unset
+    METRICS_TOKEN: Optional[str] = None
+    
+    # Upper bound on one on-demand profiling run
+    PROFILE_MAX_SECONDS: int = 60
+    
+    # Log statements slower than the threshold with their query plan, and keep
+    # per-statement aggregates for /admin/slow-queries
+    SLOW_QUERY_LOG: bool = False
+    SLOW_QUERY_THRESHOLD_MS: int = 100
+    SLOW_QUERY_MAX_STATEMENTS: int = 500
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,16 +1,23 @@
 import json
-import uuid
+from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import Text, select, type_coerce
+from sqlalchemy.orm import Session, contains_eager
 
 from app.dal.chat_dal import ChatDAL
 from app.dal.message_dal import MessageDAL
-from app.db.db import Chat, Conversation, Message
+from app.db.compression import decompress_text
+from app.db.db import Chat, Conversation, Message, MessageBranch, message_preview
+from app.db.connection import request_lookups
+from app.db.custom_types import new_id
+from app.db.query_stats import track_dal_queries
+from app.services.tracing_service import trace_methods
 from app.models.models import BranchCreate
 
 
+@trace_methods
+@track_dal_queries
 class BranchDAL:
     def __init__(self, db_session: Session):
         self.db_session = db_session
@@ -25,23 +32,26 @@ class BranchDAL:
             return None
 
         # Verify parent message exists
-        parent_message = await self.message_dal.get_message(
+        parent_message = await self.message_dal.get_message_row(
             branch.parent_chat_id, branch.parent_message_id
         )
         if not parent_message:
             return None
 
         # Create a new chat for the branch
+        now = datetime.utcnow()
         db_chat = Chat(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             account_id=account_id,
             chat_type="branch",
             name=branch.name,
+            created_at=now,
+            last_message_at=now,
         )
 
         # Create conversation record for the branch
         db_conversation = Conversation(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             chat_id=db_chat.id,
             account_id=account_id,
             name=branch.name,
@@ -52,26 +62,27 @@ class BranchDAL:
         self.db_session.add(db_chat)
         self.db_session.add(db_conversation)
 
-        # Update parent message to add reference to this branch
-        parent_msg = self.db_session.query(Message).filter(
-            Message.chat_id == branch.parent_chat_id,
-            Message.response_id == branch.parent_message_id,
-        ).first()
-
-        if parent_msg:
-            branches = parent_msg.branches or []
-            branches.append(db_chat.id)
-            parent_msg.branches = branches
-
-        # Copy messages up to the branching point
-        messages = (
-            self.db_session.query(Message)
-            .filter(Message.chat_id == branch.parent_chat_id)
+        # Link the parent message to this branch
+        self.db_session.add(MessageBranch(message_id=parent_message.id, branch_chat_id=db_chat.id))
+
+        # Copy messages up to the branching point. Bodies are read as stored
+        # so compressed ones are copied without being decoded and re-encoded.
+        messages = self.db_session.execute(
+            select(
+                Message.user_id,
+                type_coerce(Message.content, Text).label("content"),
+                Message.role,
+                Message.sender_id,
+                Message.response_id,
+                Message.message_type,
+                Message.timestamp,
+            )
+            .where(Message.chat_id == branch.parent_chat_id)
             .order_by(Message.timestamp)
-            .all()
-        )
+        ).all()
 
         found_branch_point = False
+        copied = []
         for msg in messages:
             if msg.response_id == branch.parent_message_id:
                 found_branch_point = True
@@ -81,35 +92,55 @@ class BranchDAL:
 
             # Copy this message to the new branch
             new_message = Message(
-                id=str(uuid.uuid4()),
+                id=new_id(),
                 chat_id=db_chat.id,
                 user_id=msg.user_id,
-                question=msg.question,
-                response=msg.response,
-                response_id=str(uuid.uuid4()),  # Generate new response ID
+                content=msg.content,
+                role=msg.role,
+                sender_id=msg.sender_id,
+                response_id=new_id(),  # Generate new response ID
                 message_type=msg.message_type,
                 timestamp=msg.timestamp,
-                branches=[],
             )
             self.db_session.add(new_message)
+            copied.append(msg)
+
+        # The batcher maintains these from here on
+        db_chat.message_count = len(copied)
+        if copied:
+            db_chat.last_message_at = copied[-1].timestamp
+            db_chat.last_message_preview = message_preview(decompress_text(copied[-1].content))
+
+        # The parent message's branch list and every ancestor's tree changed
+        touched = [branch.parent_chat_id] + self.chat_dal.ancestor_chat_ids(branch.parent_chat_id)
+        self.chat_dal.bump_versions(touched, account_id)
 
         self.db_session.commit()
+        await self.chat_dal.forget_chats(touched)
         self.db_session.refresh(db_chat)
+        request_lookups(self.db_session)[("chat", db_chat.id)] = db_chat
 
         return db_chat
 
     async def get_branches(self, chat_id: str, account_id: str) -> List[Conversation]:
-        """Get all branches for a chat."""
+        """Get all branches for a chat, with their chats loaded."""
         # Verify user has access to the chat
         chat = await self.chat_dal.get_chat(chat_id, account_id)
         if not chat:
             return []
 
-        # Get all conversations that have this chat as parent
-        query = select(Conversation).where(
-            Conversation.parent_chat_id == chat_id,
-            Conversation.account_id == account_id,
-            Conversation.deleted == False,
+        # Get all conversations that have this chat as parent, joined to
+        # their chats so callers do not look each one up
+        query = (
+            select(Conversation)
+            .join(Chat, Chat.id == Conversation.chat_id)
+            .options(contains_eager(Conversation.chat))
+            .where(
+                Conversation.parent_chat_id == chat_id,
+                Conversation.account_id == account_id,
+                Conversation.deleted == False,
+                Chat.account_id == account_id,
+            )
         )
 
         # Remove await - standard SQLAlchemy session is not async
@@ -117,36 +148,59 @@ class BranchDAL:
         return result.scalars().all()
 
     async def get_branch_tree(self, chat_id: str, account_id: str) -> dict:
-        """Get complete tree of branches for a chat."""
-
-        async def build_branch_tree(current_chat_id):
-            branches = []
-            branch_convs = await self.get_branches(current_chat_id, account_id)
-
-            for branch_conv in branch_convs:
-                branch_chat = await self.chat_dal.get_chat(branch_conv.chat_id, account_id)
-                if branch_chat:
-                    # Recursively get sub-branches
-                    sub_branches = await build_branch_tree(branch_chat.id)
-                    branches.append(
-                        {
-                            "chat_id": branch_chat.id,
-                            "name": branch_chat.name,
-                            "parent_message_id": branch_conv.parent_message_id,
-                            "branches": sub_branches,
-                        }
-                    )
-
-            return branches
+        """Get complete tree of branches for a chat.
 
+        The whole tree comes from one recursive query instead of one query
+        per branch and level.
+        """
         # Verify user has access to the chat
         chat = await self.chat_dal.get_chat(chat_id, account_id)
         if not chat:
             return {"chat_id": chat_id, "branches": []}
 
-        branches = await build_branch_tree(chat_id)
+        def branch_rows(parent_chat_ids):
+            return select(
+                Conversation.chat_id,
+                Conversation.parent_chat_id,
+                Conversation.parent_message_id,
+                Conversation.created_at,
+            ).where(
+                parent_chat_ids,
+                Conversation.account_id == account_id,
+                Conversation.deleted == False,
+            )
+
+        tree = branch_rows(Conversation.parent_chat_id == chat_id).cte("branch_tree", recursive=True)
+        # UNION rather than UNION ALL, so a cycle cannot recurse forever
+        tree = tree.union(branch_rows(Conversation.parent_chat_id == tree.c.chat_id))
+        rows = self.db_session.execute(
+            select(tree.c.chat_id, tree.c.parent_chat_id, tree.c.parent_message_id, Chat.name)
+            .join(Chat, Chat.id == tree.c.chat_id)
+            .where(Chat.account_id == account_id)
+            .order_by(tree.c.created_at, tree.c.chat_id)
+        ).all()
+
+        children = {}
+        for row in rows:
+            children.setdefault(row.parent_chat_id, []).append(row)
+
+        def build_branch_tree(current_chat_id, seen):
+            branches = []
+            for row in children.get(current_chat_id, []):
+                if row.chat_id in seen:
+                    continue
+                branches.append(
+                    {
+                        "chat_id": row.chat_id,
+                        "name": row.name,
+                        "parent_message_id": row.parent_message_id,
+                        "branches": build_branch_tree(row.chat_id, seen | {row.chat_id}),
+                    }
+                )
+            return branches
+
         return {
             "chat_id": chat_id,
             "name": chat.name,
-            "branches": branches,
+            "branches": build_branch_tree(chat_id, {chat_id}),
         }
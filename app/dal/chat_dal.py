@@ -1,27 +1,46 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import uuid
+from datetime import datetime
 from sqlalchemy import select, update
 
-from app.db.db import Chat, Conversation, Message
-from app.models.models import ChatCreate, ChatUpdate, QAPair
+from app.db.db import Chat, Conversation
+from app.db.connection import request_lookups
+from app.db.custom_types import new_id
+from app.db.query_stats import track_dal_queries
+from app.services.tracing_service import trace_methods
+from app.dal.message_dal import load_qa_rows
+from app.models.models import ChatCreate, ChatUpdate
+from app.services.cache_service import chat_cache
+from app.services.metrics_service import cache_requests
 
+
+def chat_to_dict(chat: Chat) -> dict:
+    """Column values of a chat, in the form stored by the chat cache."""
+    return {column.key: getattr(chat, column.key) for column in Chat.__table__.columns}
+
+
+@trace_methods
+@track_dal_queries
 class ChatDAL:
     def __init__(self, db_session: Session):
         self.db_session = db_session
         
     async def create_chat(self, chat: ChatCreate, account_id: str) -> Chat:
         """Create a new chat."""
+        # An empty chat sorts by its creation time until its first message
+        now = datetime.utcnow()
         db_chat = Chat(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             account_id=account_id,
             chat_type=chat.chat_type,
-            name=chat.name
+            name=chat.name,
+            created_at=now,
+            last_message_at=now,
         )
         
         # Create the main conversation for this chat
         db_conversation = Conversation(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             chat_id=db_chat.id,
             account_id=account_id,
             name=chat.name
@@ -31,17 +50,77 @@ class ChatDAL:
         self.db_session.add(db_conversation)
         self.db_session.commit()
         self.db_session.refresh(db_chat)
+        await chat_cache.set(db_chat.id, chat_to_dict(db_chat))
+        request_lookups(self.db_session)[("chat", db_chat.id)] = db_chat
         
         return db_chat
     
     async def get_chat(self, chat_id: str, account_id: str) -> Optional[Chat]:
-        """Get a chat by ID."""
-        chat = self.db_session.query(Chat).filter(
-            Chat.id == chat_id, 
-            Chat.account_id == account_id
-        ).first()
+        """Get a chat by ID.
+        
+        Repeated lookups within a request are answered from the session's
+        lookup memo, and first lookups from the chat cache when possible. A
+        cached chat is returned as a detached Chat that is not attached to
+        this session.
+        """
+        lookups = request_lookups(self.db_session)
+        key = ("chat", chat_id)
+        cache_requests.inc(cache="request_lookups", result="hit" if key in lookups else "miss")
+        if key in lookups:
+            chat = lookups[key]
+        else:
+            chat = await self._load_chat(chat_id)
+            lookups[key] = chat
+        
+        if not chat or chat.account_id != account_id:
+            return None
+        return chat
+    
+    async def _load_chat(self, chat_id: str) -> Optional[Chat]:
+        cached = await chat_cache.get(chat_id)
+        if cached is not None:
+            return Chat(**cached)
+        
+        chat = self.db_session.query(Chat).filter(Chat.id == chat_id).first()
+        if chat:
+            await chat_cache.set(chat.id, chat_to_dict(chat))
         return chat
     
+    def ancestor_chat_ids(self, chat_id: str) -> List[str]:
+        """Ids of the chats a branch was created from, nearest first."""
+        ancestors = []
+        current = chat_id
+        while True:
+            parent = self.db_session.execute(
+                select(Conversation.parent_chat_id).where(
+                    Conversation.chat_id == current,
+                    Conversation.parent_chat_id.is_not(None)
+                )
+            ).scalar()
+            if parent is None or parent == chat_id or parent in ancestors:
+                return ancestors
+            ancestors.append(parent)
+            current = parent
+    
+    def bump_versions(self, chat_ids: List[str], account_id: str):
+        """Advance the version of chats whose content or branch tree changed.
+        
+        Runs in the caller's transaction; call forget_chats after commit.
+        """
+        self.db_session.execute(
+            update(Chat).where(
+                Chat.id.in_(chat_ids),
+                Chat.account_id == account_id
+            ).values(version=Chat.version + 1)
+        )
+    
+    async def forget_chats(self, chat_ids: List[str]):
+        """Drop chats from the request memo and the chat cache after a write."""
+        lookups = request_lookups(self.db_session)
+        for chat_id in chat_ids:
+            lookups.pop(("chat", chat_id), None)
+            await chat_cache.invalidate(chat_id)
+    
     async def update_chat(self, chat_id: str, chat_update: ChatUpdate, account_id: str) -> Optional[Chat]:
         """Update an existing chat."""
         update_data = chat_update.dict(exclude_unset=True)
@@ -54,7 +133,11 @@ class ChatDAL:
         ).values(**update_data)
         
         self.db_session.execute(query)
+        # Branch names and visibility are part of the ancestors' trees
+        touched = [chat_id] + self.ancestor_chat_ids(chat_id)
+        self.bump_versions(touched, account_id)
         self.db_session.commit()
+        await self.forget_chats(touched)
         return await self.get_chat(chat_id, account_id)
     
     async def delete_chat(self, chat_id: str, account_id: str) -> bool:
@@ -74,45 +157,28 @@ class ChatDAL:
         ).values(active=False)
         
         result = self.db_session.execute(chat_query)
+        touched = [chat_id] + self.ancestor_chat_ids(chat_id)
+        self.bump_versions(touched, account_id)
         self.db_session.commit()
+        await self.forget_chats(touched)
         
         return result.rowcount > 0
     
     async def get_all_chats(self, account_id: str) -> List[Chat]:
-        """Get all chats for a user."""
+        """Get all chats for a user, most recently active first."""
         query = select(Chat).where(
             Chat.account_id == account_id,
             Chat.active == True
-        ).order_by(Chat.updated_at.desc())
+        ).order_by(Chat.last_message_at.desc())
         
         result = self.db_session.execute(query)
         return result.scalars().all()
     
-    async def get_chat_content(self, chat_id: str, account_id: str) -> Optional[List[QAPair]]:
-        """Get chat content from database."""
+    async def get_chat_content(self, chat_id: str, account_id: str) -> Optional[List[dict]]:
+        """Get chat content from database as QAPair-shaped dicts."""
         # First check if user has access to this chat
         chat = await self.get_chat(chat_id, account_id)
         if not chat:
             return None
             
-        # Get all messages for this chat
-        messages = self.db_session.query(Message).filter(
-            Message.chat_id == chat_id
-        ).order_by(Message.timestamp).all()
-        
-        if not messages:
-            return []
-            
-        # Convert to QAPair format
-        qa_pairs = [
-            QAPair(
-                question=message.question,
-                response=message.response,
-                response_id=message.response_id,
-                timestamp=message.timestamp,
-                branches=message.branches
-            )
-            for message in messages
-        ]
-        
-        return qa_pairs 
\ No newline at end of file
+        return load_qa_rows(self.db_session, chat_id) 
\ No newline at end of file
@@ -1,17 +1,27 @@
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-import uuid
+import string
 
 from app.models.models import MessageCreate, QAPair
 
-from app.db.db import Message
-from app.services.groq_service import GroqService
+from app.db.db import Message, MessageBranch
+from app.db.write_batcher import message_batcher
+from app.db.connection import request_lookups
+from app.db.custom_types import new_id
+from app.db.query_stats import track_dal_queries
+from app.services.tracing_service import trace_methods, tracer
+from app.services.drain_service import drain_controller
+from app.services.groq_service import get_llm_service
 
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+@trace_methods
+@track_dal_queries
 class MessageDAL:
     def __init__(self, db_session):
         self.db_session = db_session
-        self.groq_service = GroqService()
     
     async def add_message(self, chat_id: str, message, user_id: str) -> Optional[Message]:
         """Add a message to a chat and get AI response."""
@@ -19,63 +29,79 @@ class MessageDAL:
         message_content = message.content if hasattr(message, 'content') else str(message)
         message_type = message.message_type.value if hasattr(message, 'message_type') else "text"
         
+        with tracer.span("MessageDAL.add_message.history"):
+            # Get recent messages for context; the new message is passed separately
+            recent_messages = self.db_session.query(Message).filter(
+                Message.chat_id == chat_id
+            ).order_by(Message.timestamp.desc()).limit(10).all()
+            
+            # Format messages for Groq
+            chat_history = [{
+                "role": msg.role,
+                "content": msg.content
+            } for msg in reversed(recent_messages) if msg.content]
+            
+            # End the read transaction so the pooled connection is not held
+            # for the duration of the LLM call
+            self.db_session.commit()
+        
         # Create user message
         user_message = Message(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             chat_id=chat_id,
             user_id=user_id,
-            question=message_content,  # Now using the extracted content
-            content=message_content,   # Now using the extracted content
+            content=message_content,
             message_type=message_type,
             role="user",
             sender_id=user_id
         )
         
-        self.db_session.add(user_message)
-        self.db_session.commit()
-        
-        # Get recent messages for context
-        recent_messages = self.db_session.query(Message).filter(
-            Message.chat_id == chat_id
-        ).order_by(Message.timestamp.desc()).limit(10).all()
+        # Group-commit the insert while the AI response is generated
+        bind = self.db_session.get_bind()
+        user_written = message_batcher.submit(user_message, bind)
         
-        # Format messages for Groq
-        chat_history = [{
-            "role": msg.role or ("user" if msg.user_id else "assistant"),
-            "content": msg.content or msg.question or msg.response or ""
-        } for msg in reversed(recent_messages) if msg.content or msg.question or msg.response]
-        
-        # Generate AI response
-        groq_service = GroqService()
-        ai_response_text = await groq_service.generate_response(
+        # Generate AI response; on shutdown a partial response is kept
+        groq_service = get_llm_service()
+        ai_response_text, _ = await drain_controller.generate(
+            groq_service,
             message_content,  # Using extracted content
             chat_history
         )
         
         # Create AI message
         ai_message = Message(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             chat_id=chat_id,
             user_id=None,
-            response=ai_response_text,
             content=ai_response_text,
-            response_id=str(uuid.uuid4()),
+            response_id=new_id(),
             message_type="text",
             role="assistant",
-            sender_id="AI"
+            sender_id="AI",
+            branch_links=[]
         )
         
-        self.db_session.add(ai_message)
-        self.db_session.commit()
+        # Only acknowledge once both rows are durable
+        with tracer.span("message_batcher.commit"):
+            await message_batcher.submit(ai_message, bind)
+            await user_written
         
         return ai_message
     
+    async def get_message_row(self, chat_id: str, message_id: str) -> Optional[Message]:
+        """Get the Message row for a response id, memoized for the request."""
+        lookups = request_lookups(self.db_session)
+        key = ("message", chat_id, message_id)
+        if key not in lookups:
+            lookups[key] = self.db_session.query(Message).filter(
+                Message.chat_id == chat_id,
+                Message.response_id == message_id
+            ).first()
+        return lookups[key]
+    
     async def get_message(self, chat_id: str, message_id: str) -> Optional[QAPair]:
         """Get a specific message from a chat."""
-        message = self.db_session.query(Message).filter(
-            Message.chat_id == chat_id,
-            Message.response_id == message_id
-        ).first()
+        message = await self.get_message_row(chat_id, message_id)
         
         if message:
             return QAPair(
@@ -88,37 +114,61 @@ class MessageDAL:
         
         return None
     
-    async def get_chat_messages(self, chat_id: str) -> List[QAPair]:
-        """Get all messages for a chat."""
-        messages = self.db_session.query(Message).filter(
-            Message.chat_id == chat_id
-        ).order_by(Message.timestamp).all()
-        
-        return [
-            QAPair(
-                question=message.question,
-                response=message.response,
-                response_id=message.response_id,
-                timestamp=message.timestamp,
-                branches=message.branches
-            )
-            for message in messages
-        ]
+    async def get_chat_messages(self, chat_id: str) -> List[dict]:
+        """Get all messages for a chat as QAPair-shaped dicts."""
+        return load_qa_rows(self.db_session, chat_id)
     
-    async def search_messages(self, chat_id: str, query: str) -> List[QAPair]:
+    async def search_messages(self, chat_id: str, query: str) -> List[dict]:
         """Search for messages containing the query within a chat."""
-        messages = self.db_session.query(Message).filter(
-            Message.chat_id == chat_id,
-            (Message.question.like(f"%{query}%") | Message.response.like(f"%{query}%"))
-        ).order_by(Message.timestamp).all()
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = Message.content.like(f"%{escaped}%", escape="\\")
+        if self.db_session.get_bind().dialect.name != "sqlite":
+            return load_qa_rows(self.db_session, chat_id, pattern)
         
-        return [
-            QAPair(
-                question=message.question,
-                response=message.response,
-                response_id=message.response_id,
-                timestamp=message.timestamp,
-                branches=message.branches
-            )
-            for message in messages
-        ] 
\ No newline at end of file
+        # LIKE cannot see inside compressed (BLOB) bodies, so those are
+        # decoded and matched the way SQLite's LIKE matches text: a literal
+        # substring, case-insensitive for ASCII letters only
+        needle = query.translate(_ASCII_LOWER)
+        blobs = self.db_session.execute(
+            select(Message.id, Message.content)
+            .where(Message.chat_id == chat_id, func.typeof(Message.content) == "blob")
+        )
+        matched = [message_id for message_id, content in blobs if needle in content.translate(_ASCII_LOWER)]
+        if matched:
+            pattern = pattern | Message.id.in_(matched)
+        return load_qa_rows(self.db_session, chat_id, pattern)
+
+
+def load_qa_rows(db_session: Session, chat_id: str, *criteria) -> List:
+    """Load a chat's messages as QAPair-shaped dicts, ordered by timestamp.
+    
+    Only the needed columns are selected, as tuples, and the branch links of
+    the whole chat come from one indexed query, so no ORM objects or pydantic
+    models are built. The dicts can be serialized straight to JSON.
+    """
+    rows = db_session.execute(
+        select(Message.id, Message.content, Message.role, Message.response_id, Message.timestamp)
+        .where(Message.chat_id == chat_id, *criteria)
+        .order_by(Message.timestamp)
+    ).all()
+    if not rows:
+        return []
+    
+    branches = {}
+    links = db_session.execute(
+        select(MessageBranch.message_id, MessageBranch.branch_chat_id)
+        .where(MessageBranch.message_id.in_(select(Message.id).where(Message.chat_id == chat_id)))
+    )
+    for message_id, branch_chat_id in links:
+        branches.setdefault(message_id, []).append(branch_chat_id)
+    
+    qa_rows = []
+    for message_id, content, role, response_id, timestamp in rows:
+        qa_rows.append({
+            "question": content if role == "user" else None,
+            "response": content if role == "assistant" else None,
+            "response_id": response_id,
+            "timestamp": timestamp,
+            "branches": branches.get(message_id, []),
+        })
+    return qa_rows
@@ -0,0 +1,147 @@
+"""Compression of large message bodies, with optional trained zlib dictionaries.
+
+Usage:
+    python -m app.db.compression train [--samples 5000] [--size 32768]
+
+Training samples message bodies from the primary database and every shard
+and writes the next `<id>.zdict` file into MESSAGE_COMPRESSION_DICT_DIR. New
+bodies are compressed with the newest dictionary; older ones stay readable
+for as long as their dictionary file is kept.
+"""
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional, Union
+
+from app.config import settings
+
+# First byte of a stored compressed body
+RAW_ZLIB = 0x01
+DICT_ZLIB = 0x02
+
+_dictionaries: Optional[Dict[int, bytes]] = None
+
+
+def dictionaries() -> Dict[int, bytes]:
+    """Trained dictionaries by id, loaded once from MESSAGE_COMPRESSION_DICT_DIR."""
+    global _dictionaries
+    if _dictionaries is None:
+        _dictionaries = {}
+        directory = settings.MESSAGE_COMPRESSION_DICT_DIR
+        if directory and os.path.isdir(directory):
+            for name in os.listdir(directory):
+                stem, ext = os.path.splitext(name)
+                if ext == ".zdict" and stem.isdigit() and 0 < int(stem) < 256:
+                    with open(os.path.join(directory, name), "rb") as f:
+                        _dictionaries[int(stem)] = f.read()
+    return _dictionaries
+
+
+def compress_text(text: str) -> Union[str, bytes]:
+    """Compress `text` when it is over the threshold and compression pays off."""
+    threshold = settings.MESSAGE_COMPRESSION_THRESHOLD
+    if not threshold or len(text) < threshold:
+        return text
+
+    data = text.encode("utf-8")
+    available = dictionaries()
+    if available:
+        dict_id = max(available)
+        compressor = zlib.compressobj(settings.MESSAGE_COMPRESSION_LEVEL, zdict=available[dict_id])
+        compressed = bytes([DICT_ZLIB, dict_id]) + compressor.compress(data) + compressor.flush()
+    else:
+        compressed = bytes([RAW_ZLIB]) + zlib.compress(data, settings.MESSAGE_COMPRESSION_LEVEL)
+
+    return compressed if len(compressed) < len(data) else text
+
+
+def decompress_text(value: Union[str, bytes]) -> str:
+    """Inverse of compress_text; plain text passes through unchanged."""
+    if isinstance(value, str):
+        return value
+
+    if value[0] == RAW_ZLIB:
+        return zlib.decompress(value[1:]).decode("utf-8")
+    if value[0] == DICT_ZLIB:
+        decompressor = zlib.decompressobj(zdict=dictionaries()[value[1]])
+        return (decompressor.decompress(value[2:]) + decompressor.flush()).decode("utf-8")
+    raise ValueError(f"Unknown message body encoding {value[0]:#x}")
+
+
+def train_dictionary(samples: Iterable[str], size: int) -> bytes:
+    """Build a zlib preset dictionary from the segments most shared across samples.
+
+    zlib references the dictionary like earlier input, and nearer content is
+    cheaper to reference, so the most common segments go at the end.
+    """
+    counts = Counter()
+    for sample in samples:
+        segments = {
+            segment for segment in re.split(r"(?<=[.!?:;\n])\s+", sample)
+            if len(segment) >= 8
+        }
+        counts.update(segments)
+
+    chosen, total = [], 0
+    for segment, count in sorted(counts.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+        if count < 2:
+            break
+        encoded = segment.encode("utf-8")
+        if total + len(encoded) > size:
+            continue
+        chosen.append((count, encoded))
+        total += len(encoded)
+
+    chosen.sort(key=lambda item: item[0])
+    return b"".join(encoded for _, encoded in chosen)
+
+
+def main():
+    import argparse
+    import logging
+
+    from sqlalchemy import func, select
+
+    from app.db.db import Message
+    from app.db.migrations.common import all_engines, configure_logging
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train = subparsers.add_parser("train", help="Train a new dictionary from stored messages")
+    train.add_argument("--samples", type=int, default=5000, help="Message bodies to sample per database")
+    train.add_argument("--size", type=int, default=32 * 1024, help="Dictionary size in bytes (zlib uses at most 32 KiB)")
+    args = parser.parse_args()
+
+    configure_logging()
+    directory = settings.MESSAGE_COMPRESSION_DICT_DIR
+    if not directory:
+        parser.error("MESSAGE_COMPRESSION_DICT_DIR is not set")
+
+    samples = []
+    for db_engine in all_engines():
+        with db_engine.connect() as conn:
+            samples.extend(conn.execute(
+                select(Message.content)
+                .where(Message.content.is_not(None))
+                .order_by(func.random())
+                .limit(args.samples)
+            ).scalars())
+
+    dictionary = train_dictionary(samples, min(args.size, 32 * 1024))
+    if not dictionary:
+        logging.info("Not enough repeated content to train a dictionary")
+        return
+
+    next_id = max(dictionaries(), default=0) + 1
+    if next_id > 255:
+        parser.error("All 255 dictionary ids are in use")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{next_id}.zdict")
+    with open(path, "wb") as f:
+        f.write(dictionary)
+    logging.info(f"Wrote {len(dictionary)} byte dictionary from {len(samples)} samples to {path}")
+
+
+if __name__ == "__main__":
+    main()
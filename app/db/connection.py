@@ -1,13 +1,79 @@
-from sqlalchemy import create_engine
+import asyncio
+import logging
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, Session
 
 from app.config import settings
 
-# Create synchronous engine
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}  # SQLite specific
-)
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the production SQLite profile to every new pooled connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers proceed while a writer holds the lock
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        # NORMAL only fsyncs at checkpoints in WAL mode and is still crash-safe
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        # Recommended for long-lived connections: analyze only what needs it
+        cursor.execute("PRAGMA optimize=0x10002")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(database_url: str) -> Engine:
+    """Create an engine with explicit pool sizing and, for SQLite, the storage profile."""
+    url = make_url(database_url)
+    pool_args = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+
+    if url.get_backend_name() != "sqlite":
+        return create_engine(database_url, pool_pre_ping=True, **pool_args)
+
+    if url.database in (None, "", ":memory:"):
+        # In-memory databases live in a single connection, so no pool sizing
+        return create_engine(database_url, connect_args={"check_same_thread": False})
+
+    db_engine = create_engine(
+        database_url,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        },
+        **pool_args,
+    )
+    event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+    return db_engine
+
+
+def optimize_database(db_engine: Engine):
+    """Run PRAGMA optimize so the query planner statistics stay current."""
+    if db_engine.dialect.name != "sqlite":
+        return
+    with db_engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+
+
+async def optimize_periodically(db_engine: Engine, interval_seconds: int):
+    """Background task running PRAGMA optimize every `interval_seconds`."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(optimize_database, db_engine)
+        except Exception as e:
+            logging.error(f"PRAGMA optimize failed: {str(e)}")
+
+
+# The single engine and session factory shared by every route
+engine = create_db_engine(settings.SQLALCHEMY_DATABASE_URL)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -18,4 +84,14 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+def request_lookups(session: Session) -> dict:
+    """Per-session memo of chat and message lookups.
+    
+    Lives in `session.info`, so every DAL built on the same session shares
+    it and it is dropped with the session at the end of the request. Keys are
+    tuples such as ("chat", chat_id); a stored None records a miss.
+    """
+    return session.info.setdefault("lookups", {})
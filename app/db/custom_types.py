@@ -1,38 +1,109 @@
+import os
+import time
 import uuid
-from sqlalchemy.types import TypeDecorator, CHAR
+from sqlalchemy.types import TypeDecorator, BINARY, LargeBinary, Text
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 
+from app.db.compression import compress_text, decompress_text
+
+
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID (RFC 9562 version 7).
+
+    The leading 48 bits are the Unix time in milliseconds, so new ids sort
+    after old ones and inserts land at the right edge of the B-tree instead
+    of splitting random pages.
+    """
+    unix_ms = time.time_ns() // 1_000_000
+    value = (unix_ms & 0xFFFFFFFFFFFF) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | (0x7 << 76)  # Version 7
+    value = value & ~(0x3 << 62) | (0x2 << 62)  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+
+def new_id() -> str:
+    """New primary key value in the canonical string form used by the models."""
+    return str(uuid7())
+
+
 class UUID(TypeDecorator):
     """Platform-independent UUID type.
-    
-    Uses PostgreSQL's UUID type when available, otherwise uses
-    CHAR(36), storing as string representation.
+
+    Uses PostgreSQL's UUID type when available, otherwise stores the 16 raw
+    bytes (BLOB on SQLite, BINARY(16) elsewhere) instead of the 36 character
+    string, shrinking both rows and every index that includes the column.
+
+    Values are returned as uuid.UUID, or as canonical strings when
+    `as_uuid=False` so that code passing ids around as strings keeps working.
     """
-    
-    impl = CHAR
+
+    impl = BINARY
     cache_ok = True
 
+    def __init__(self, *args, as_uuid: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.as_uuid = as_uuid
+
     def load_dialect_impl(self, dialect):
         if dialect.name == 'postgresql':
-            return dialect.type_descriptor(PG_UUID())
+            return dialect.type_descriptor(PG_UUID(as_uuid=self.as_uuid))
+        elif dialect.name == 'sqlite':
+            return dialect.type_descriptor(LargeBinary())
         else:
-            return dialect.type_descriptor(CHAR(36))
+            return dialect.type_descriptor(BINARY(16))
 
     def process_bind_param(self, value, dialect):
         if value is None:
             return value
         elif dialect.name == 'postgresql':
             return value
+        elif isinstance(value, bytes):
+            return value
         else:
-            if isinstance(value, uuid.UUID):
-                return str(value)
-            else:
-                return str(uuid.UUID(value))
+            if not isinstance(value, uuid.UUID):
+                try:
+                    value = uuid.UUID(str(value))
+                except ValueError:
+                    # Not a UUID, so it can never equal a stored id; bind it
+                    # unchanged and let the lookup find nothing
+                    return str(value).encode()
+            return value.bytes
 
     def process_result_value(self, value, dialect):
         if value is None:
             return value
         else:
-            if not isinstance(value, uuid.UUID):
+            if isinstance(value, bytes):
+                value = uuid.UUID(bytes=value)
+            elif not isinstance(value, uuid.UUID):
+                # Text ids written before the binary migration
                 value = uuid.UUID(value)
-            return value 
\ No newline at end of file
+            return value if self.as_uuid else str(value)
+
+
+class CompressedText(TypeDecorator):
+    """Text column that transparently compresses large values on SQLite.
+
+    Values under MESSAGE_COMPRESSION_THRESHOLD stay plain TEXT, so LIKE and
+    other SQL string functions keep working on them. Larger values are stored
+    as a zlib BLOB, which SQLite accepts in any column. Other dialects store
+    plain text. Already-encoded bytes are bound unchanged, so rows can be
+    copied without decompressing them.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def coerce_compared_value(self, op, value):
+        # LIKE patterns and comparisons must never be compressed
+        return Text()
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes) or dialect.name != 'sqlite':
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        return decompress_text(value)
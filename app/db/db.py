@@ -1,19 +1,13 @@
-from sqlalchemy import create_engine, Column, String, ForeignKey, Text, Boolean, DateTime, JSON, Table
+from sqlalchemy import Column, String, ForeignKey, Text, Boolean, DateTime, Table, Integer, Index
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-import uuid
+from sqlalchemy.orm import relationship
 import enum
 
-# Create synchronous engine - note the regular sqlite:// URL
-SQLALCHEMY_DATABASE_URL = "sqlite:///./database.db"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
-)
+from app.db.custom_types import CompressedText, UUID, new_id
 
-# Create regular sessionmaker
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Engine, session factory and get_db come from the one shared connection module
+from app.db.connection import engine, SessionLocal, get_db
 
 Base = declarative_base()
 
@@ -28,18 +22,10 @@ class ChatType(enum.Enum):
 def create_tables():
     Base.metadata.create_all(bind=engine)
 
-# Dependency for synchronous DB access
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class User(Base):
     __tablename__ = "users"
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=False), primary_key=True, default=new_id)
     username = Column(String(50), unique=True, index=True)
     email = Column(String(100), unique=True, index=True)
     hashed_password = Column(String(100))
@@ -49,17 +35,36 @@ class User(Base):
     # Relationships
     chats = relationship("Chat", back_populates="owner")
 
+PREVIEW_LENGTH = 200
+
+def message_preview(content):
+    """Chat list preview of a message body."""
+    return content[:PREVIEW_LENGTH] if content else content
+
 class Chat(Base):
     __tablename__ = "chats"
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=False), primary_key=True, default=new_id)
     name = Column(String(255), nullable=False)
     chat_type = Column(String, nullable=False)
-    account_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    account_id = Column(UUID(as_uuid=False), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     active = Column(Boolean, default=True)
     
+    # Denormalized summary for the chat list, maintained as messages are written
+    last_message_at = Column(DateTime, nullable=True)
+    last_message_preview = Column(String(PREVIEW_LENGTH), nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped by every write visible in the chat's content or branch tree; the
+    # ETag of those responses, so a match proves nothing has changed
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    __table_args__ = (
+        # Serves list-chats: one account's active chats, most recent first
+        Index("ix_chats_account_active_last_message", "account_id", "active", "last_message_at"),
+    )
+    
     # Relationships
     owner = relationship("User", back_populates="chats")
     conversations = relationship("Conversation", back_populates="chat")
@@ -68,12 +73,12 @@ class Chat(Base):
 class Conversation(Base):
     __tablename__ = "conversations"
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    chat_id = Column(String(36), ForeignKey("chats.id"), nullable=False)
-    account_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=new_id)
+    chat_id = Column(UUID(as_uuid=False), ForeignKey("chats.id"), nullable=False)
+    account_id = Column(UUID(as_uuid=False), ForeignKey("users.id"), nullable=False)
     name = Column(String(255), nullable=False)
-    parent_chat_id = Column(String(36), nullable=True)
-    parent_message_id = Column(String(36), nullable=True)
+    parent_chat_id = Column(UUID(as_uuid=False), nullable=True)
+    parent_message_id = Column(UUID(as_uuid=False), nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     deleted = Column(Boolean, default=False)
     
@@ -84,22 +89,42 @@ class Conversation(Base):
 class Message(Base):
     __tablename__ = "messages"
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    chat_id = Column(String(36), ForeignKey("chats.id"), nullable=False)
-    user_id = Column(String(36), ForeignKey("users.id"), nullable=True)
-    question = Column(Text, nullable=True)
-    response = Column(Text, nullable=True)
-    response_id = Column(String(36), default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=False), primary_key=True, default=new_id)
+    chat_id = Column(UUID(as_uuid=False), ForeignKey("chats.id"), nullable=False)
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id"), nullable=True)
+    response_id = Column(UUID(as_uuid=False), default=new_id)
     message_type = Column(String(50), default="text")
     timestamp = Column(DateTime, server_default=func.now())
-    branches = Column(JSON, default=list)
     
-    # Add these new fields
-    content = Column(Text, nullable=True)  # Unified content field
+    content = Column(CompressedText, nullable=True)  # Message body, the only copy of the text
     role = Column(String(20), nullable=True)  # user or assistant
     sender_id = Column(String(36), nullable=True)  # Can be user_id or "AI"
     
     # Relationships
     chat = relationship("Chat", back_populates="messages")
     user = relationship("User", foreign_keys=[user_id], backref="sent_messages")
+    # Loaded only when accessed; lists of messages get their links from
+    # load_qa_rows, or opt in with selectinload(Message.branch_links)
+    branch_links = relationship("MessageBranch", lazy="select", cascade="all, delete-orphan")
+    
+    @property
+    def branches(self):
+        """Ids of the chats branched from this message."""
+        return [link.branch_chat_id for link in self.branch_links]
+    
+    # QAPair view of the body: user messages are questions, AI messages responses
+    @property
+    def question(self):
+        return self.content if self.role == "user" else None
+    
+    @property
+    def response(self):
+        return self.content if self.role == "assistant" else None
 
+class MessageBranch(Base):
+    __tablename__ = "message_branches"
+    
+    # The primary key indexes the message end, branch_chat_id the other
+    message_id = Column(UUID(as_uuid=False), ForeignKey("messages.id"), primary_key=True)
+    branch_chat_id = Column(UUID(as_uuid=False), ForeignKey("chats.id"), primary_key=True, index=True)
+    created_at = Column(DateTime, server_default=func.now())
@@ -0,0 +1,87 @@
+"""Rewrite text UUID columns as 16-byte binary values on SQLite.
+
+Usage:
+    python -m app.db.migrations.binary_uuids [--batch-size 5000] [--vacuum]
+
+SQLite stores a BLOB unchanged whatever the declared column type, so the
+rewrite happens in place in rowid-ordered batches, one transaction each.
+Values that are already binary are left alone, so the migration can be
+interrupted and re-run. Pass --vacuum to reclaim the freed pages afterwards.
+"""
+import argparse
+import logging
+import uuid
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.db.custom_types import UUID
+from app.db.db import Base
+from app.db.migrations.common import all_engines, configure_logging
+
+
+def uuid_blob(value):
+    """SQL function converting a text UUID to its 16 raw bytes."""
+    if not isinstance(value, str):
+        return value
+    try:
+        return uuid.UUID(value).bytes
+    except ValueError:
+        return value
+
+
+def uuid_columns():
+    """Map of table name to the UUID columns it holds."""
+    return {
+        table.name: [column.name for column in table.columns if isinstance(column.type, UUID)]
+        for table in Base.metadata.sorted_tables
+        if any(isinstance(column.type, UUID) for column in table.columns)
+    }
+
+
+def migrate_engine(db_engine: Engine, batch_size: int):
+    existing_tables = set(inspect(db_engine).get_table_names())
+
+    for table, columns in uuid_columns().items():
+        if table not in existing_tables:
+            continue
+
+        assignments = ", ".join(f"{column} = uuid_blob({column})" for column in columns)
+        with db_engine.connect() as conn:
+            max_rowid = conn.exec_driver_sql(f"SELECT max(rowid) FROM {table}").scalar() or 0
+
+        last_rowid = 0
+        while last_rowid < max_rowid:
+            with db_engine.begin() as conn:
+                conn.connection.driver_connection.create_function(
+                    "uuid_blob", 1, uuid_blob, deterministic=True
+                )
+                conn.exec_driver_sql(
+                    f"UPDATE {table} SET {assignments} WHERE rowid > ? AND rowid <= ?",
+                    (last_rowid, last_rowid + batch_size),
+                )
+            last_rowid += batch_size
+
+        logging.info(f"{db_engine.url.database}: converted {table} ({', '.join(columns)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM each database afterwards")
+    args = parser.parse_args()
+
+    configure_logging()
+    for db_engine in all_engines():
+        if db_engine.dialect.name != "sqlite":
+            logging.info(f"Skipping {db_engine.url}: native UUID columns need no rewrite")
+            continue
+
+        migrate_engine(db_engine, args.batch_size)
+        if args.vacuum:
+            with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql("VACUUM")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Add the chat list summary columns to `chats` and backfill them from `messages`.
+
+Usage:
+    python -m app.db.migrations.chat_summaries [--batch-size 1000]
+
+Adds `last_message_at`, `last_message_preview` and `message_count` plus the
+(account_id, active, last_message_at) index where they are missing, then
+recomputes every chat's summary in one pass over `messages`. Chats without
+messages get their creation time as `last_message_at`. Values are
+written absolutely, in batches of chats, so the migration can be re-run at
+any time; run it while writes are paused so no message lands between the
+scan and the update.
+"""
+import argparse
+import logging
+from typing import Dict, List
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.db.compression import decompress_text
+from app.db.db import Chat, message_preview
+from app.db.migrations.common import all_engines, configure_logging
+
+SUMMARY_COLUMNS = {
+    "last_message_at": "DATETIME",
+    "last_message_preview": "VARCHAR(200)",
+    "message_count": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+def add_columns(db_engine: Engine):
+    existing = {column["name"] for column in inspect(db_engine).get_columns("chats")}
+    with db_engine.begin() as conn:
+        for name, ddl in SUMMARY_COLUMNS.items():
+            if name not in existing:
+                conn.exec_driver_sql(f"ALTER TABLE chats ADD COLUMN {name} {ddl}")
+                logging.info(f"{db_engine.url.database}: added chats.{name}")
+
+    for index in Chat.__table__.indexes:
+        index.create(bind=db_engine, checkfirst=True)
+
+
+def collect_summaries(db_engine: Engine) -> Dict[bytes, List]:
+    """[count, last timestamp, last body] per chat id, from one scan of `messages`."""
+    summaries: Dict[bytes, List] = {}
+    with db_engine.connect() as conn:
+        result = conn.exec_driver_sql(
+            "SELECT chat_id, timestamp, content FROM messages ORDER BY rowid"
+        )
+        for chat_id, timestamp, content in result:
+            summary = summaries.setdefault(chat_id, [0, None, None])
+            summary[0] += 1
+            if summary[1] is None or (timestamp is not None and timestamp >= summary[1]):
+                summary[1], summary[2] = timestamp, content
+    return summaries
+
+
+def migrate_engine(db_engine: Engine, batch_size: int):
+    if "chats" not in inspect(db_engine).get_table_names():
+        return
+
+    add_columns(db_engine)
+    summaries = collect_summaries(db_engine)
+
+    with db_engine.connect() as conn:
+        chat_ids = [row[0] for row in conn.exec_driver_sql("SELECT id FROM chats ORDER BY rowid")]
+
+    for start in range(0, len(chat_ids), batch_size):
+        updates = []
+        for chat_id in chat_ids[start:start + batch_size]:
+            count, timestamp, content = summaries.get(chat_id, (0, None, None))
+            preview = message_preview(decompress_text(content)) if content is not None else None
+            updates.append((count, timestamp, preview, chat_id))
+        with db_engine.begin() as conn:
+            conn.exec_driver_sql(
+                """
+                UPDATE chats
+                SET message_count = ?, last_message_at = COALESCE(?, created_at), last_message_preview = ?
+                WHERE id = ?
+                """,
+                updates,
+            )
+
+    logging.info(f"{db_engine.url.database}: summarized {len(chat_ids)} chats")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    configure_logging()
+    for db_engine in all_engines():
+        migrate_engine(db_engine, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
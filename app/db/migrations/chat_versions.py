@@ -0,0 +1,40 @@
+"""Add the `chats.version` counter used for ETags.
+
+Usage:
+    python -m app.db.migrations.chat_versions
+
+Existing chats start at version 0. The column is only added where it is
+missing, so the migration can be re-run.
+"""
+import argparse
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.db.migrations.common import all_engines, configure_logging
+
+
+def migrate_engine(db_engine: Engine):
+    inspector = inspect(db_engine)
+    if "chats" not in inspector.get_table_names():
+        return
+    if "version" in {column["name"] for column in inspector.get_columns("chats")}:
+        logging.info(f"{db_engine.url.database}: already migrated")
+        return
+
+    with db_engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE chats ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    logging.info(f"{db_engine.url.database}: added chats.version")
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+
+    configure_logging()
+    for db_engine in all_engines():
+        migrate_engine(db_engine)
+
+
+if __name__ == "__main__":
+    main()
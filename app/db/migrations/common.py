@@ -0,0 +1,20 @@
+import logging
+from typing import List
+
+from sqlalchemy.engine import Engine
+
+from app.db.connection import engine
+from app.db.sharding import shard_router
+
+
+def all_engines() -> List[Engine]:
+    """The primary database followed by every shard, each listed once."""
+    engines = [engine]
+    for shard_engine in shard_router.engines:
+        if shard_engine not in engines:
+            engines.append(shard_engine)
+    return engines
+
+
+def configure_logging():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
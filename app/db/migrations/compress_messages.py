@@ -0,0 +1,79 @@
+"""Compress existing message bodies over MESSAGE_COMPRESSION_THRESHOLD.
+
+Usage:
+    python -m app.db.migrations.compress_messages [--batch-size 1000] [--vacuum]
+
+Only plain-text bodies over the threshold are rewritten, in rowid-ordered
+batches of one transaction each, so the migration can be interrupted and
+re-run. Run it again after training a new dictionary; bodies that are already
+compressed keep their original encoding.
+"""
+import argparse
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.db.compression import compress_text
+from app.db.migrations.common import all_engines, configure_logging
+
+
+def migrate_engine(db_engine: Engine, batch_size: int):
+    if "messages" not in inspect(db_engine).get_table_names():
+        return
+
+    with db_engine.connect() as conn:
+        max_rowid = conn.exec_driver_sql("SELECT max(rowid) FROM messages").scalar() or 0
+
+    compressed = 0
+    last_rowid = 0
+    while last_rowid < max_rowid:
+        with db_engine.begin() as conn:
+            rows = conn.exec_driver_sql(
+                """
+                SELECT rowid, content FROM messages
+                WHERE rowid > ? AND rowid <= ?
+                  AND typeof(content) = 'text' AND length(content) >= ?
+                """,
+                (last_rowid, last_rowid + batch_size, settings.MESSAGE_COMPRESSION_THRESHOLD),
+            ).all()
+
+            updates = []
+            for rowid, content in rows:
+                encoded = compress_text(content)
+                if isinstance(encoded, bytes):
+                    updates.append((encoded, rowid))
+
+            if updates:
+                conn.exec_driver_sql("UPDATE messages SET content = ? WHERE rowid = ?", updates)
+                compressed += len(updates)
+        last_rowid += batch_size
+
+    logging.info(f"{db_engine.url.database}: compressed {compressed} message bodies")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM each database afterwards")
+    args = parser.parse_args()
+
+    configure_logging()
+    if not settings.MESSAGE_COMPRESSION_THRESHOLD:
+        logging.info("MESSAGE_COMPRESSION_THRESHOLD is 0, nothing to do")
+        return
+
+    for db_engine in all_engines():
+        if db_engine.dialect.name != "sqlite":
+            logging.info(f"Skipping {db_engine.url}: compression is only applied on SQLite")
+            continue
+
+        migrate_engine(db_engine, args.batch_size)
+        if args.vacuum:
+            with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql("VACUUM")
+
+
+if __name__ == "__main__":
+    main()
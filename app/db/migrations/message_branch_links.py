@@ -0,0 +1,89 @@
+"""Move Message.branches JSON lists into the message_branches link table.
+
+Usage:
+    python -m app.db.migrations.message_branch_links [--batch-size 5000] [--keep-column]
+
+Links are copied in rowid-ordered batches with INSERT OR IGNORE, so the
+migration can be interrupted and re-run. Once every batch is done the JSON
+column is dropped; pass --keep-column to only copy the links.
+"""
+import argparse
+import json
+import logging
+import uuid
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.db.db import MessageBranch
+from app.db.migrations.common import all_engines, configure_logging
+
+
+def copy_links(db_engine: Engine, batch_size: int) -> int:
+    with db_engine.connect() as conn:
+        max_rowid = conn.exec_driver_sql("SELECT max(rowid) FROM messages").scalar() or 0
+
+    copied = 0
+    last_rowid = 0
+    while last_rowid < max_rowid:
+        with db_engine.begin() as conn:
+            rows = conn.exec_driver_sql(
+                """
+                SELECT id, branches FROM messages
+                WHERE rowid > ? AND rowid <= ?
+                  AND branches IS NOT NULL AND branches != '[]'
+                """,
+                (last_rowid, last_rowid + batch_size),
+            ).all()
+
+            links = []
+            for message_id, branches in rows:
+                for branch_chat_id in json.loads(branches) or []:
+                    # Match the id storage of the row: binary after the
+                    # binary_uuids migration, text before it
+                    if isinstance(message_id, bytes):
+                        branch_chat_id = uuid.UUID(branch_chat_id).bytes
+                    links.append((message_id, branch_chat_id))
+
+            if links:
+                conn.exec_driver_sql(
+                    "INSERT OR IGNORE INTO message_branches (message_id, branch_chat_id) VALUES (?, ?)",
+                    links,
+                )
+                copied += len(links)
+        last_rowid += batch_size
+
+    return copied
+
+
+def migrate_engine(db_engine: Engine, batch_size: int, keep_column: bool):
+    inspector = inspect(db_engine)
+    if "messages" not in inspector.get_table_names():
+        return
+    if "branches" not in {column["name"] for column in inspector.get_columns("messages")}:
+        logging.info(f"{db_engine.url.database}: already migrated")
+        return
+
+    MessageBranch.__table__.create(bind=db_engine, checkfirst=True)
+    copied = copy_links(db_engine, batch_size)
+    logging.info(f"{db_engine.url.database}: copied {copied} branch links")
+
+    if not keep_column:
+        with db_engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE messages DROP COLUMN branches")
+        logging.info(f"{db_engine.url.database}: dropped messages.branches")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--keep-column", action="store_true", help="Copy links without dropping messages.branches")
+    args = parser.parse_args()
+
+    configure_logging()
+    for db_engine in all_engines():
+        migrate_engine(db_engine, args.batch_size, args.keep_column)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Move message text into the single `content` column and drop `question`/`response`.
+
+Usage:
+    python -m app.db.migrations.message_content [--batch-size 5000] [--keep-columns] [--vacuum]
+
+Older rows (and branch copies) only have `question` or `response` set, and
+some have no `role`. The backfill fills `content` and `role` from them in
+rowid-ordered batches, one transaction each, and only touches rows that
+still need it, so it can be interrupted and re-run. Once every batch is done
+the legacy columns are dropped, which rewrites the table without the second
+copy of the text; pass --keep-columns to backfill only.
+"""
+import argparse
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.db.migrations.common import all_engines, configure_logging
+
+LEGACY_COLUMNS = ("question", "response")
+
+
+def backfill(db_engine: Engine, batch_size: int):
+    with db_engine.connect() as conn:
+        max_rowid = conn.exec_driver_sql("SELECT max(rowid) FROM messages").scalar() or 0
+
+    last_rowid = 0
+    while last_rowid < max_rowid:
+        with db_engine.begin() as conn:
+            conn.exec_driver_sql(
+                """
+                UPDATE messages
+                SET content = COALESCE(content, question, response),
+                    role = COALESCE(role, CASE WHEN question IS NOT NULL THEN 'user' ELSE 'assistant' END)
+                WHERE rowid > ? AND rowid <= ?
+                  AND (content IS NULL OR role IS NULL)
+                """,
+                (last_rowid, last_rowid + batch_size),
+            )
+        last_rowid += batch_size
+
+
+def migrate_engine(db_engine: Engine, batch_size: int, keep_columns: bool):
+    inspector = inspect(db_engine)
+    if "messages" not in inspector.get_table_names():
+        return
+
+    legacy = [
+        column["name"] for column in inspector.get_columns("messages")
+        if column["name"] in LEGACY_COLUMNS
+    ]
+    if not legacy:
+        logging.info(f"{db_engine.url.database}: already migrated")
+        return
+
+    backfill(db_engine, batch_size)
+    logging.info(f"{db_engine.url.database}: backfilled messages.content")
+
+    if keep_columns:
+        return
+
+    with db_engine.begin() as conn:
+        for column in legacy:
+            conn.exec_driver_sql(f"ALTER TABLE messages DROP COLUMN {column}")
+    logging.info(f"{db_engine.url.database}: dropped messages.{', messages.'.join(legacy)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--keep-columns", action="store_true", help="Backfill without dropping the legacy columns")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM each database afterwards")
+    args = parser.parse_args()
+
+    configure_logging()
+    for db_engine in all_engines():
+        migrate_engine(db_engine, args.batch_size, args.keep_columns)
+        if args.vacuum and db_engine.dialect.name == "sqlite":
+            with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql("VACUUM")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Per-request SQL statement counts and database time.
+
+Every statement run on any engine is timed into the db_query_duration
+metric and charged to the QueryStats of the current context. QueryStatsMiddleware opens one per HTTP request (and can
+report it in response headers), `track_queries` attributes statements to DAL
+methods, and `assert_max_queries` turns an upper bound into a failing
+assertion so that a new N+1 shows up in tests. Slow statements are handed to
+the slow query log along with the DAL method that ran them.
+"""
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.db.slow_query_log import slow_query_log
+from app.services.metrics_service import db_query_duration
+
+
+class QueryStats:
+    # Statements kept for assertion messages
+    MAX_LOGGED = 50
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        # Statements are also charged to the enclosing block, so that
+        # assert_max_queries sees those of requests made inside it
+        self.parent = parent
+        self.statements = 0
+        self.db_time = 0.0
+        self.calls: Dict[str, List[float]] = {}
+        self.log: List[str] = []
+
+    def record(self, statement: str, duration: float):
+        self.statements += 1
+        self.db_time += duration
+        if len(self.log) < self.MAX_LOGGED:
+            self.log.append(statement)
+        if self.parent is not None:
+            self.parent.record(statement, duration)
+
+    def header_values(self) -> Dict[str, str]:
+        values = {
+            "X-DB-Queries": str(self.statements),
+            "X-DB-Time-Ms": f"{self.db_time * 1000:.2f}",
+        }
+        if self.calls:
+            values["X-DB-Calls"] = ", ".join(
+                f"{name}={int(statements)}" for name, (statements, _) in self.calls.items()
+            )
+        return values
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+# `Class.method` of the innermost tracked DAL call
+_current_call: ContextVar[Optional[str]] = ContextVar("dal_call", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def _finish(statement: str, started: list) -> float:
+    duration = time.perf_counter() - started.pop()
+    db_query_duration.observe(duration, operation=statement.split(None, 1)[0].upper() if statement else "")
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    return duration
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if started:
+        duration = _finish(statement, started)
+        slow_query_log.record(conn, statement, parameters, executemany, duration, _current_call.get())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        _finish(context.statement or "", started)
+
+
+@contextmanager
+def collect_queries():
+    """Charge statements run inside the block to a fresh QueryStats."""
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = "block"):
+    """Fail with the statements run when the block runs more than `limit`."""
+    with collect_queries() as stats:
+        yield stats
+    if stats.statements > limit:
+        statements = "\n".join(f"  {statement}" for statement in stats.log)
+        raise AssertionError(f"{label} ran {stats.statements} SQL statements, expected at most {limit}:\n{statements}")
+
+
+def track_queries(func):
+    """Attribute the statements an async DAL method runs to `Class.method`."""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _current_call.set(name)
+        stats = _current.get()
+        statements, db_time = (stats.statements, stats.db_time) if stats is not None else (0, 0.0)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _current_call.reset(token)
+            if stats is not None:
+                totals = stats.calls.setdefault(name, [0, 0.0])
+                totals[0] += stats.statements - statements
+                totals[1] += stats.db_time - db_time
+
+    return wrapper
+
+
+def track_dal_queries(cls):
+    """Class decorator applying track_queries to every public async method."""
+    for attribute, value in list(vars(cls).items()):
+        if not attribute.startswith("_") and inspect.iscoroutinefunction(value):
+            setattr(cls, attribute, track_queries(value))
+    return cls
+
+
+class QueryStatsMiddleware:
+    """Collect QueryStats per HTTP request, optionally reporting them as headers."""
+
+    def __init__(self, app: ASGIApp, include_headers: bool):
+        self.app = app
+        self.include_headers = include_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with collect_queries() as stats:
+            async def send_with_stats(message: Message):
+                if message["type"] == "http.response.start" and self.include_headers:
+                    # Statements run while streaming the body are not included
+                    headers = MutableHeaders(raw=message["headers"])
+                    for key, value in stats.header_values().items():
+                        headers[key] = value
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
@@ -0,0 +1,95 @@
+"""Move accounts to their new shard after DATABASE_SHARD_URLS has grown.
+
+Usage:
+    python -m app.db.rebalance_shards --from-count 2 [--dry-run]
+
+`--from-count` is the number of shards the data was written with; the new
+layout is every URL currently in DATABASE_SHARD_URLS. Run it while writes are
+paused. Each account is copied to its new shard (replacing any partial copy
+from an interrupted run) and only then deleted from the old one, so the tool
+can simply be re-run after a failure.
+"""
+import argparse
+import logging
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Engine
+
+from app.db.db import Chat, Conversation, Message, MessageBranch
+from app.db.sharding import ShardRouter, shard_router
+
+BATCH_SIZE = 1000
+
+
+def account_tables(account_id: str):
+    """(table, filter) pairs selecting an account's rows, parents first."""
+    chat_ids = select(Chat.id).where(Chat.account_id == account_id).scalar_subquery()
+    message_ids = select(Message.id).where(Message.chat_id.in_(chat_ids)).scalar_subquery()
+    return [
+        (Chat.__table__, Chat.account_id == account_id),
+        (Conversation.__table__, Conversation.account_id == account_id),
+        (Message.__table__, Message.chat_id.in_(chat_ids)),
+        (MessageBranch.__table__, MessageBranch.message_id.in_(message_ids)),
+    ]
+
+
+def move_account(account_id: str, source: Engine, target: Engine) -> int:
+    """Copy one account's rows from `source` to `target`, then delete them from `source`."""
+    tables = account_tables(account_id)
+    moved = 0
+
+    with target.begin() as target_conn:
+        for table, where in reversed(tables):
+            target_conn.execute(delete(table).where(where))
+        with source.connect() as source_conn:
+            for table, where in tables:
+                result = source_conn.execute(select(table).where(where))
+                while True:
+                    rows = result.mappings().fetchmany(BATCH_SIZE)
+                    if not rows:
+                        break
+                    target_conn.execute(insert(table), [dict(row) for row in rows])
+                    moved += len(rows)
+
+    with source.begin() as source_conn:
+        for table, where in reversed(tables):
+            source_conn.execute(delete(table).where(where))
+
+    return moved
+
+
+def rebalance(router: ShardRouter, from_count: int, dry_run: bool = False):
+    for old_index in range(from_count):
+        source = router.engines[old_index]
+        with source.connect() as conn:
+            account_ids = conn.execute(select(Chat.account_id).distinct()).scalars().all()
+
+        for account_id in account_ids:
+            new_index = router.shard_for(account_id)
+            if new_index == old_index:
+                continue
+
+            if dry_run:
+                logging.info(f"Would move account {account_id}: shard {old_index} -> {new_index}")
+                continue
+
+            moved = move_account(account_id, source, router.engines[new_index])
+            logging.info(f"Moved account {account_id}: shard {old_index} -> {new_index} ({moved} rows)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-count", type=int, required=True, help="Shard count the data was written with")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which accounts would move")
+    args = parser.parse_args()
+
+    if not 0 < args.from_count <= shard_router.shard_count:
+        parser.error(f"--from-count must be between 1 and {shard_router.shard_count}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    shard_router.create_tables()
+    rebalance(shard_router, args.from_count, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
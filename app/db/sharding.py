@@ -0,0 +1,97 @@
+import hashlib
+from typing import List
+
+from fastapi import Depends
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker, Session
+
+from app.config import settings
+from app.db.connection import create_db_engine, engine, get_db
+from app.db.db import Base
+from app.models.models import User
+from app.services.metrics_service import metrics
+from app.utils.security import get_current_active_user
+
+
+def jump_hash(key: int, num_buckets: int) -> int:
+    """Jump consistent hash: growing N to N+1 buckets only moves 1/(N+1) of keys."""
+    bucket, j = -1, 0
+    while j < num_buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+class ShardRouter:
+    """Routes an account's chats, conversations and messages to one of N databases.
+
+    Users stay in the primary database because logins look them up by
+    username. Every other table is scoped to a single account, so each
+    account's rows live together on the shard chosen by `shard_for`.
+    """
+
+    def __init__(self, shard_urls: List[str], primary_engine: Engine):
+        primary_url = primary_engine.url.render_as_string(hide_password=False)
+        self.engines: List[Engine] = [
+            primary_engine if url == primary_url else create_db_engine(url)
+            for url in shard_urls
+        ] or [primary_engine]
+        self.session_factories = [
+            sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+            for shard_engine in self.engines
+        ]
+
+    @property
+    def shard_count(self) -> int:
+        return len(self.engines)
+
+    @staticmethod
+    def shard_index(account_id: str, shard_count: int) -> int:
+        """Return the shard holding `account_id` for a given shard count."""
+        digest = hashlib.blake2b(str(account_id).encode(), digest_size=8).digest()
+        return jump_hash(int.from_bytes(digest, "big"), shard_count)
+
+    def shard_for(self, account_id: str) -> int:
+        return self.shard_index(account_id, self.shard_count)
+
+    def engine_for(self, account_id: str) -> Engine:
+        return self.engines[self.shard_for(account_id)]
+
+    def session_for(self, account_id: str) -> Session:
+        return self.session_factories[self.shard_for(account_id)]()
+
+    def create_tables(self):
+        for shard_engine in self.engines:
+            Base.metadata.create_all(bind=shard_engine)
+
+
+shard_router = ShardRouter(settings.DATABASE_SHARD_URLS, engine)
+
+metrics.gauge(
+    "db_pool_connections_in_use",
+    "Pooled connections checked out, per database.",
+    ("database",),
+    collect=lambda: [
+        ((str(db_engine.url.database),), db_engine.pool.checkedout())
+        for db_engine in {engine, *shard_router.engines}
+        if hasattr(db_engine.pool, "checkedout")
+    ],
+)
+
+
+# Dependency to get a session on the current user's shard
+def get_shard_db(
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # Reuse the request's primary session when the account lives there
+    if shard_router.engine_for(current_user.id) is db.get_bind():
+        yield db
+        return
+
+    shard_db = shard_router.session_for(current_user.id)
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
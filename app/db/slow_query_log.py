@@ -0,0 +1,125 @@
+"""Opt-in log of slow SQL statements with their query plans.
+
+query_stats times every statement; when SLOW_QUERY_LOG is on, statements
+slower than SLOW_QUERY_THRESHOLD_MS are passed here. Each distinct statement is
+logged the first time it is slow, with the types of its bound parameters
+(never their values), the DAL method that ran it and its query plan. After that,
+it is only aggregated. The aggregates back the /admin/slow-queries endpoint.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+
+
+def parameter_shape(parameters: Any) -> str:
+    """Describe bound parameters by type only, e.g. "(str, int)"."""
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def explain(connection, statement: str, parameters: Any) -> str:
+    """Query plan for a statement, run on a separate cursor of the same connection."""
+    dialect = connection.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    except Exception as e:
+        return f"EXPLAIN failed: {str(e)}"
+    finally:
+        cursor.close()
+    if dialect == "sqlite":
+        # (id, parent, notused, detail)
+        return "\n".join(f"{row[0]}|{row[1]}| {row[3]}" for row in rows)
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+class _SlowStatement:
+    __slots__ = ("statement", "count", "total", "max", "callers", "parameters", "plan", "last_seen")
+
+    def __init__(self, statement: str, parameters: str, plan: str):
+        self.statement = statement
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.callers: Dict[str, int] = {}
+        self.parameters = parameters
+        self.plan = plan
+        self.last_seen = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 2),
+            "mean_ms": round(self.total / self.count * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "callers": self.callers,
+            "parameters": self.parameters,
+            "plan": self.plan,
+            "last_seen": self.last_seen,
+        }
+
+
+class SlowQueryLog:
+    """Aggregated slow statements keyed by SQL text."""
+
+    def __init__(self, enabled: bool, threshold: float, max_statements: int):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_statements = max_statements
+        self._statements: Dict[str, _SlowStatement] = {}
+        self._lock = threading.Lock()
+
+    def record(self, connection, statement: str, parameters: Any, executemany: bool,
+               duration: float, caller: Optional[str]):
+        if not self.enabled or duration < self.threshold:
+            return
+
+        with self._lock:
+            entry = self._statements.get(statement)
+        if entry is None:
+            sample = parameters[0] if executemany and parameters else parameters
+            entry = _SlowStatement(statement, parameter_shape(sample), explain(connection, statement, sample))
+            logging.warning(
+                f"Slow query {duration * 1000:.1f}ms in {caller or 'unknown'}: {statement} "
+                f"params={entry.parameters}\n{entry.plan}"
+            )
+
+        with self._lock:
+            full = self._statements and len(self._statements) >= self.max_statements
+            if full and statement not in self._statements:
+                # Make room by dropping the statement that has cost the least
+                # overall, never the one being added
+                cheapest = min(self._statements.values(), key=lambda item: item.total)
+                del self._statements[cheapest.statement]
+            entry = self._statements.setdefault(statement, entry)
+            entry.count += 1
+            entry.total += duration
+            entry.max = max(entry.max, duration)
+            entry.last_seen = time.time()
+            key = caller or "unknown"
+            entry.callers[key] = entry.callers.get(key, 0) + 1
+
+    def top(self, limit: int, sort: str = "total") -> List[Dict]:
+        with self._lock:
+            entries = sorted(self._statements.values(), key=lambda item: getattr(item, sort), reverse=True)
+            return [entry.as_dict() for entry in entries[:limit]]
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+
+
+slow_query_log = SlowQueryLog(
+    enabled=settings.SLOW_QUERY_LOG,
+    threshold=settings.SLOW_QUERY_THRESHOLD_MS / 1000,
+    max_statements=settings.SLOW_QUERY_MAX_STATEMENTS,
+)
@@ -0,0 +1,191 @@
+import asyncio
+import contextvars
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.db import Chat, Message, message_preview
+from app.services.cache_service import chat_cache
+from app.services.metrics_service import metrics, message_batch_rows
+
+
+class MessageWriteBatcher:
+    """Write-behind batcher that group-commits message inserts.
+
+    Messages submitted by concurrent requests are collected for up to
+    `interval_ms` or `max_rows` rows and written in a single transaction per
+    database, so many chats share one commit (and one fsync) instead of paying
+    for their own. Each submission returns a future that resolves once its row
+    is durable, for callers that need the acknowledgement.
+    """
+
+    def __init__(self, max_rows: int, interval_ms: int):
+        self.max_rows = max_rows
+        self.interval = interval_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            if self._loop is not loop:
+                self._queue = asyncio.Queue()
+            self._loop = loop
+            # A clean context, so that the worker's statements are not charged
+            # to the query stats of whichever request happened to start it
+            self._worker = loop.create_task(self._run(), context=contextvars.Context())
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, message: Message, bind: Engine) -> asyncio.Future:
+        """Queue a message for insert into the database behind `bind`."""
+        self._ensure_worker()
+        if message.timestamp is None:
+            # Stamp on arrival so ordering does not depend on flush time
+            message.timestamp = datetime.utcnow()
+        future = self._loop.create_future()
+        self._queue.put_nowait((message, bind, future))
+        return future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[Message, Engine, asyncio.Future]]):
+        by_bind: Dict[Engine, List[Tuple[Message, asyncio.Future]]] = {}
+        for message, bind, future in batch:
+            by_bind.setdefault(bind, []).append((message, future))
+
+        # Shards have independent write locks, so flush them concurrently
+        await asyncio.gather(*(self._flush_bind(bind, items) for bind, items in by_bind.items()))
+
+    async def _flush_bind(self, bind: Engine, items: List[Tuple[Message, asyncio.Future]]):
+        message_batch_rows.observe(len(items))
+        try:
+            await asyncio.to_thread(self._commit, bind, [message for message, _ in items])
+        except Exception as e:
+            if len(items) == 1:
+                self._resolve(items, e)
+                return
+            # Retry rows one by one so a single bad row does not fail
+            # the unrelated writes it was batched with
+            logging.warning(f"Batch of {len(items)} messages failed, retrying individually: {str(e)}")
+            for item in items:
+                try:
+                    await asyncio.to_thread(self._commit, bind, [item[0]])
+                except Exception as item_error:
+                    self._resolve([item], item_error)
+                else:
+                    self._resolve([item])
+            await self._invalidate_chats(items)
+            return
+
+        self._resolve(items)
+        await self._invalidate_chats(items)
+
+    @staticmethod
+    async def _invalidate_chats(items: List[Tuple[Message, asyncio.Future]]):
+        # Cached chats carry the summary columns updated by the commit
+        for chat_id in {message.chat_id for message, _ in items}:
+            await chat_cache.invalidate(chat_id)
+
+    @staticmethod
+    def _resolve(items: List[Tuple[Message, asyncio.Future]], error: Optional[Exception] = None):
+        for message, future in items:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(message)
+            else:
+                logging.error(f"Failed to write message {message.id}: {str(error)}")
+                future.set_exception(error)
+                # Nobody may be waiting for a best-effort write
+                future.exception()
+
+    @staticmethod
+    def _commit(bind: Engine, messages: List[Message]):
+        # Keep loaded attributes after commit so callers can read the rows
+        with Session(bind=bind, expire_on_commit=False) as session:
+            session.add_all(messages)
+            MessageWriteBatcher._update_chat_summaries(session, messages)
+            session.commit()
+
+    @staticmethod
+    def _update_chat_summaries(session: Session, messages: List[Message]):
+        """Apply the batch to each chat's version, count and last-message columns.
+
+        One UPDATE per chat rather than per message. The last message only
+        replaces the stored one if it is not older, so batches committed out
+        of order keep the newest preview.
+        """
+        summaries: Dict[str, Tuple[int, Message]] = {}
+        for message in messages:
+            count, latest = summaries.get(message.chat_id, (0, message))
+            if message.timestamp >= latest.timestamp:
+                latest = message
+            summaries[message.chat_id] = (count + 1, latest)
+
+        # A fixed order keeps concurrent flushes from deadlocking on row locks
+        for chat_id in sorted(summaries):
+            count, latest = summaries[chat_id]
+            newer = or_(Chat.last_message_at.is_(None), Chat.last_message_at <= latest.timestamp)
+            session.execute(
+                update(Chat)
+                .where(Chat.id == chat_id)
+                .values(
+                    message_count=Chat.message_count + count,
+                    version=Chat.version + 1,
+                    last_message_at=case((newer, latest.timestamp), else_=Chat.last_message_at),
+                    last_message_preview=case(
+                        (newer, message_preview(latest.content)), else_=Chat.last_message_preview
+                    ),
+                )
+            )
+
+    async def close(self):
+        """Flush queued messages and stop the worker."""
+        if self._worker is None or self._worker.done():
+            return
+        # The sentinel lets the worker drain everything queued before it
+        self._queue.put_nowait(None)
+        await self._worker
+        self._worker = None
+
+
+message_batcher = MessageWriteBatcher(
+    max_rows=settings.MESSAGE_BATCH_MAX_ROWS,
+    interval_ms=settings.MESSAGE_BATCH_INTERVAL_MS,
+)
+
+metrics.gauge(
+    "message_batch_queue_depth",
+    "Messages waiting for the next group commit.",
+    collect=lambda: [((), message_batcher.queue_depth)],
+)
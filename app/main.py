@@ -1,16 +1,29 @@
 from datetime import timedelta
+import asyncio
 import logging
 import uvicorn
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
 
 from app.config import settings
+from app.db.connection import engine, optimize_database, optimize_periodically
 from app.db.db import create_tables
-from app.routes import auth, branches, chats, messages, websockets
+from app.db.query_stats import QueryStatsMiddleware
+from app.db.sharding import shard_router
+from app.db.write_batcher import message_batcher
+from app.routes import admin, auth, branches, chats, messages, websockets
 from app.services.cache_service import CacheService
+from app.services.drain_service import drain_controller
+from app.services.groq_service import close_llm_service
+from app.services.loop_monitor import loop_monitor
+from app.services.metrics_service import MetricsMiddleware, metrics
+from app.services.tracing_service import TracingMiddleware
+from app.utils.gzip_middleware import CompressionMiddleware
+from app.utils.security import verify_metrics_token
 
 # Configure logging
 logging.basicConfig(
@@ -34,17 +47,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON responses such as chat histories and branch trees
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.GZIP_MINIMUM_SIZE,
+    compress_level=settings.GZIP_COMPRESS_LEVEL,
+    content_types=settings.GZIP_CONTENT_TYPES,
+)
+
+# Root span per request; DAL, LLM and broadcast spans nest under it
+app.add_middleware(TracingMiddleware)
+
+# Count SQL statements and database time per request
+app.add_middleware(QueryStatsMiddleware, include_headers=settings.QUERY_STATS_HEADERS)
+
+# Request latency per route, outermost so it covers the other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(chats.router)
 app.include_router(messages.router)
 app.include_router(branches.router)
 app.include_router(websockets.router)
+app.include_router(admin.router)
 
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     create_tables()
+    shard_router.create_tables()
+
+    # Keep SQLite planner statistics fresh on long-running workers
+    app.state.optimize_tasks = [
+        asyncio.create_task(optimize_periodically(db_engine, settings.SQLITE_OPTIMIZE_INTERVAL_SECONDS))
+        for db_engine in {engine, *shard_router.engines}
+    ]
+
+    # Drain sockets and in-flight generations on SIGTERM before the server stops
+    drain_controller.install_signal_handler()
+
+    # Loop lag metrics, and blocking-call stacks when LOOP_BLOCKING_DETECTOR is on
+    loop_monitor.start()
 
     # Initialize FastAPICache
     FastAPICache.init(
@@ -59,6 +103,16 @@ def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logging.info("Application shutting down")
+    # No-op when SIGTERM already drained; persists checkpoints before the batcher closes
+    await drain_controller.drain()
+    await message_batcher.close()
+    await close_llm_service()
+    await loop_monitor.stop()
+
+    for task in app.state.optimize_tasks:
+        task.cancel()
+    for db_engine in {engine, *shard_router.engines}:
+        optimize_database(db_engine)
 
 
 @app.get("/")
@@ -68,8 +122,25 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    # 503 while draining, so load balancers stop routing new work here
+    if drain_controller.draining:
+        return ORJSONResponse({"status": "draining"}, status_code=503)
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(verify_metrics_token)])
+async def metrics_endpoint():
+    """Prometheus text exposition of the service metrics, for the scraper's token."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+        ws_ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT_SECONDS,
+    ) 
\ No newline at end of file
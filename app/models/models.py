@@ -51,6 +51,9 @@ class ChatResponse(ChatBase):
     chat_type: str
     account_id: str
     created_at: datetime
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
+    message_count: int = 0
     
     class Config:
         from_attributes = True
@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.db.slow_query_log import slow_query_log
+from app.models.models import User
+from app.services.profiling_service import ProfilerBusy, profiling_service
+from app.utils.security import get_current_admin_user
+
+router = APIRouter(
+    prefix=f"{settings.API_V1_STR}/admin",
+    tags=["admin"]
+)
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    allocations: bool = False,
+    top: int = Query(25, ge=1, le=500),
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Profile this worker for `seconds` while it keeps serving traffic.
+    
+    Returns collapsed stacks for flamegraph.pl or speedscope, plus the top
+    allocation sites when `allocations` is set. With format=collapsed only the
+    stacks are returned, as plain text.
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must be at most {settings.PROFILE_MAX_SECONDS}"
+        )
+    
+    try:
+        result = await profiling_service.profile(seconds, interval_ms / 1000, allocations, top)
+    except ProfilerBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running")
+    
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"] + "\n")
+    return result
+
+@router.get("/slow-queries")
+async def slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    sort: str = Query("total", pattern="^(total|max|count)$"),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Top slow statements on this worker, with callers and query plans."""
+    return {
+        "enabled": slow_query_log.enabled,
+        "threshold_ms": slow_query_log.threshold * 1000,
+        "statements": slow_query_log.top(limit, sort),
+    }
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries(current_user: User = Depends(get_current_admin_user)):
+    """Reset the slow query aggregates."""
+    slow_query_log.clear()
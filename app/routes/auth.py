@@ -2,13 +2,14 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-import uuid
 
 from app.models.models import Token, UserCreate, UserResponse, User as UserSchema
 from app.services.auth_service import AuthService
 from app.utils.security import get_current_active_user, get_password_hash, verify_password, create_access_token
 from app.config import settings
-from app.db.db import get_db, User as UserModel
+from app.db.connection import get_db
+from app.db.db import User as UserModel
+from app.db.custom_types import new_id
 
 router = APIRouter(
     prefix=f"{settings.API_V1_STR}/auth",
@@ -53,7 +54,7 @@ async def register_user(user_create: UserCreate, db: Session = Depends(get_db)):
     # Create new user with hashed password
     hashed_password = get_password_hash(user_create.password)
     db_user = UserModel(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         username=user_create.username,
         email=user_create.email,
         hashed_password=hashed_password,
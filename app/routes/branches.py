@@ -1,14 +1,15 @@
 from typing import Dict, List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 
 from app.config import settings
 from app.dal.branch_dal import BranchDAL
 from app.dal.chat_dal import ChatDAL
-from app.db.connection import get_db
+from app.db.sharding import get_shard_db
 from app.models.models import BranchCreate, ChatResponse, User
 from app.utils.security import get_current_active_user
+from app.utils.etag import chat_etag, etag_response, not_modified
 
 router = APIRouter(
     prefix="/api/v1/branches",
@@ -20,7 +21,7 @@ router = APIRouter(
 async def create_branch(
     branch: BranchCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
     """Create a new branch from a specific message."""
     branch_dal = BranchDAL(db)
@@ -38,46 +39,49 @@ async def create_branch(
 async def get_branches(
     chat_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
     """Get all branches for a chat."""
     branch_dal = BranchDAL(db)
     branches = await branch_dal.get_branches(chat_id, current_user.id)
     
-    # Convert ORM objects to dict for response
-    result = []
-    for branch in branches:
-        # Get the chat for this branch
-        chat_dal = ChatDAL(db)
-        chat = await chat_dal.get_chat(branch.chat_id, current_user.id)
-        
-        if chat:
-            result.append({
-                "chat_id": branch.chat_id,
-                "name": chat.name,
-                "parent_message_id": branch.parent_message_id,
-                "created_at": chat.created_at
-            })
-    
-    return result
+    # Convert ORM objects to dict for response; each branch's chat was
+    # loaded by the same query
+    return [
+        {
+            "chat_id": branch.chat_id,
+            "name": branch.chat.name,
+            "parent_message_id": branch.parent_message_id,
+            "created_at": branch.chat.created_at
+        }
+        for branch in branches
+    ]
 
 @router.get("/tree/{chat_id}")
 async def get_branch_tree(
     chat_id: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
-    """Get complete tree of branches for a chat."""
+    """Get complete tree of branches for a chat; 304 when If-None-Match is current."""
+    chat = await ChatDAL(db).get_chat(chat_id, current_user.id)
+    if chat:
+        etag = chat_etag(chat, "tree")
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+    
     branch_dal = BranchDAL(db)
     tree = await branch_dal.get_branch_tree(chat_id, current_user.id)
-    return tree
+    return etag_response(tree, etag) if chat else tree
 
 @router.put("/set-active-branch", response_model=dict)
 async def set_active_branch(
     chat_id: str,
     branch_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
     """Set a specific branch as the active branch for a chat.
     
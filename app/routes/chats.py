@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List
 
 from app.models.models import ChatCreate, ChatResponse, ChatUpdate, User, QAPair
 from app.dal.chat_dal import ChatDAL
 from app.utils.security import get_current_active_user
-from app.db.connection import get_db
+from app.utils.etag import chat_etag, etag_response, not_modified
+from app.services.transfer_service import AccountImporter, TransferService
+from app.db.sharding import get_shard_db
 from app.config import settings
-from app.services.cache_service import CacheService
 
 router = APIRouter(
     prefix=f"{settings.API_V1_STR}/chats",
@@ -18,7 +22,7 @@ router = APIRouter(
 async def create_chat(
     chat: ChatCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
     """Create a new chat."""
     chat_dal = ChatDAL(db)
@@ -26,11 +30,10 @@ async def create_chat(
     return db_chat
 
 @router.get("/get-chat", response_model=ChatResponse)
-@CacheService.cache_response(expire=300)  # Cache for 5 minutes
 async def get_chat(
     chat_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
     """Get chat details."""
     chat_dal = ChatDAL(db)
@@ -47,12 +50,26 @@ async def get_chat(
 @router.get("/get-chat-content", response_model=List[QAPair])
 async def get_chat_content(
     chat_id: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
-    """Get chat content including messages."""
+    """Get chat content including messages.
+    
+    Answers 304 when If-None-Match carries the current ETag, without
+    reading any messages.
+    """
     chat_dal = ChatDAL(db)
-    content = await chat_dal.get_chat_content(chat_id, current_user.id)
+    chat = await chat_dal.get_chat(chat_id, current_user.id)
+    content = None
+    if chat:
+        # Take the ETag before reading, so a concurrent write can only make
+        # it older than the content, never newer
+        etag = chat_etag(chat, "content")
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        content = await chat_dal.get_chat_content(chat_id, current_user.id)
     
     if content is None:
         raise HTTPException(
@@ -60,14 +77,15 @@ async def get_chat_content(
             detail="Chat content not found or you don't have permission"
         )
     
-    return content
+    # Rows are already in QAPair shape, so skip re-validating them
+    return etag_response(content, etag)
 
 @router.put("/update-chat", response_model=ChatResponse)
 async def update_chat(
     chat_id: str,
     chat_update: ChatUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
     """Update chat metadata."""
     chat_dal = ChatDAL(db)
@@ -85,7 +103,7 @@ async def update_chat(
 async def delete_chat(
     chat_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
     """Delete a chat."""
     chat_dal = ChatDAL(db)
@@ -102,9 +120,57 @@ async def delete_chat(
 @router.get("/list-chats", response_model=List[ChatResponse])
 async def list_chats(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
     """Get all active chats for the current user."""
     chat_dal = ChatDAL(db)
     chats = await chat_dal.get_all_chats(current_user.id)
-    return chats 
\ No newline at end of file
+    return chats 
+
+@router.get("/export")
+async def export_chats(current_user: User = Depends(get_current_active_user)):
+    """Stream all of the current user's chats, with messages and branches, as NDJSON."""
+    return StreamingResponse(
+        TransferService.export_account(current_user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="chats.ndjson"'},
+    )
+
+@router.post("/import", response_model=Dict[str, int])
+async def import_chats(
+    request: Request,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Bulk-load an NDJSON export into the current user's account.
+    
+    Rows are inserted in large batched transactions without calling the LLM.
+    Every row gets a new id, so an export can be imported more than once.
+    """
+    importer = AccountImporter(current_user.id, new_ids=True)
+    max_line = settings.TRANSFER_MAX_LINE_BYTES
+    buffer = bytearray()
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            # Only the new bytes can hold the line's end
+            end = buffer.rfind(b"\n", max(0, len(buffer) - len(chunk)))
+            if end >= 0:
+                for line in bytes(buffer[:end]).split(b"\n"):
+                    if len(line) > max_line:
+                        raise ValueError(f"line longer than {max_line} bytes")
+                    importer.add(line)
+                    if importer.full:
+                        await asyncio.to_thread(importer.flush)
+                del buffer[:end + 1]
+            if len(buffer) > max_line:
+                raise ValueError(f"line longer than {max_line} bytes")
+        importer.add(bytes(buffer))
+        await asyncio.to_thread(importer.flush)
+    except ValueError as e:
+        # Batches already flushed stay imported
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid export: {str(e)} (imported so far: {importer.counts})"
+        )
+    
+    return importer.counts
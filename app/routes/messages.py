@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.models.models import MessageCreate, QAPair, User
 from app.dal.message_dal import MessageDAL
 from app.dal.chat_dal import ChatDAL
 from app.utils.security import get_current_active_user
-from app.db.connection import get_db
+from app.utils.etag import chat_etag, etag_response, not_modified
+from app.db.sharding import get_shard_db
 from app.config import settings
+from app.services.drain_service import drain_controller
+from app.services.idempotency_service import idempotency_store
 
 router = APIRouter(
     prefix=f"{settings.API_V1_STR}/messages",
@@ -18,37 +22,57 @@ router = APIRouter(
 async def add_message(
     message: MessageCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Add a message to a chat."""
-    # First verify user has access to the chat
-    chat_dal = ChatDAL(db)
-    chat = await chat_dal.get_chat(message.chat_id, current_user.id)
+    """Add a message to a chat.
     
-    if not chat:
+    Retries carrying the same Idempotency-Key get the original reply back
+    instead of inserting the message and calling the LLM again. While the
+    worker drains for shutdown, new messages get a 503 with Retry-After.
+    """
+    if drain_controller.draining:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat not found or you don't have permission to add messages"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is restarting",
+            headers={"Retry-After": str(drain_controller.retry_after_seconds())}
         )
     
-    message_dal = MessageDAL(db)
-    message_result = await message_dal.add_message(message.chat_id, message, current_user.id)
+    async def add():
+        # First verify user has access to the chat
+        chat_dal = ChatDAL(db)
+        chat = await chat_dal.get_chat(message.chat_id, current_user.id)
+        
+        if not chat:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat not found or you don't have permission to add messages"
+            )
+        
+        message_dal = MessageDAL(db)
+        message_result = await message_dal.add_message(message.chat_id, message, current_user.id)
+        
+        if not message_result:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to add message"
+            )
+        
+        # Detach the result from the session so retries can reuse it
+        return QAPair.model_validate(message_result)
     
-    if not message_result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to add message"
-        )
-    
-    return message_result
+    key = f"add-message:{current_user.id}:{message.chat_id}:{idempotency_key}" if idempotency_key else None
+    async with drain_controller.work():
+        return await idempotency_store.run(key, add)
 
 @router.get("/get-messages", response_model=List[QAPair])
 async def get_messages(
     chat_id: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
-    """Get all messages for a chat."""
+    """Get all messages for a chat; 304 when If-None-Match is current."""
     # First verify user has access to the chat
     chat_dal = ChatDAL(db)
     chat = await chat_dal.get_chat(chat_id, current_user.id)
@@ -59,17 +83,23 @@ async def get_messages(
             detail="Chat not found or you don't have permission to view messages"
         )
     
+    etag = chat_etag(chat, "content")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
     message_dal = MessageDAL(db)
     messages = await message_dal.get_chat_messages(chat_id)
     
-    return messages
+    # Rows are already in QAPair shape, so skip re-validating them
+    return etag_response(messages, etag)
 
 @router.get("/search", response_model=List[QAPair])
 async def search_messages(
     chat_id: str,
     query: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shard_db)
 ):
     """Search for messages in a chat."""
     # First verify user has access to the chat
@@ -85,4 +115,4 @@ async def search_messages(
     message_dal = MessageDAL(db)
     messages = await message_dal.search_messages(chat_id, query)
     
-    return messages 
\ No newline at end of file
+    return ORJSONResponse(messages) 
\ No newline at end of file
@@ -1,55 +1,123 @@
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, status, Query
 import json
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Set
 import asyncio
-import uuid
-from sqlalchemy.orm import Session
 import logging
+import time
 from jose import jwt
 
-from app.models.models import MessageCreate, User
-from app.db.db import Chat
+from app.models.models import MessageCreate
+from app.db.db import Message, User
+from app.dal.chat_dal import ChatDAL
 from app.dal.message_dal import MessageDAL
 from app.utils.security import get_password_hash, verify_password
 from app.services.auth_service import AuthService
-from app.db.connection import get_db
+from app.db.connection import SessionLocal
+from app.db.sharding import shard_router
+from app.db.write_batcher import message_batcher
+from app.db.custom_types import new_id
 from app.config import settings
-from app.services.groq_service import GroqService
+from app.services.tracing_service import traced, tracer
+from app.services.drain_service import drain_controller
+from app.services.groq_service import get_llm_service
+from app.services.idempotency_service import idempotency_store
+from app.services.metrics_service import metrics, websocket_broadcast_duration, websocket_broadcast_fanout
 
 router = APIRouter(tags=["websockets"])
 
 # Store active connections
 class ConnectionManager:
-    def __init__(self):
-        # chat_id -> list of websocket connections
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-        
-    async def connect(self, websocket: WebSocket, chat_id: str, user_id: str):
+    def __init__(self, max_connections: int, send_timeout: float):
+        # chat_id -> set of websocket connections
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self.connection_count = 0
+        self.max_connections = max_connections
+        self.send_timeout = send_timeout
+    
+    @property
+    def full(self) -> bool:
+        return self.connection_count >= self.max_connections
+    
+    async def connect(self, websocket: WebSocket, chat_id: str, user_id: str) -> bool:
+        """Accept and register a socket, or turn it away when the process is at its cap or draining."""
         await websocket.accept()
-        if chat_id not in self.active_connections:
-            self.active_connections[chat_id] = []
-        self.active_connections[chat_id].append(websocket)
+        if drain_controller.draining:
+            await self.send_restart(websocket)
+            return False
+        if self.full:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Server at connection limit")
+            return False
+        self.active_connections.setdefault(chat_id, set()).add(websocket)
+        self.connection_count += 1
+        return True
     
     def disconnect(self, websocket: WebSocket, chat_id: str):
-        if chat_id in self.active_connections:
-            if websocket in self.active_connections[chat_id]:
-                self.active_connections[chat_id].remove(websocket)
-            if not self.active_connections[chat_id]:
+        connections = self.active_connections.get(chat_id)
+        if connections is not None and websocket in connections:
+            connections.discard(websocket)
+            self.connection_count -= 1
+            if not connections:
                 del self.active_connections[chat_id]
     
+    async def _send(self, websocket: WebSocket, chat_id: str, message: dict):
+        try:
+            await asyncio.wait_for(websocket.send_json(message), self.send_timeout)
+        except Exception as e:
+            # A dead or stalled socket is dropped rather than holding up the
+            # chat, and closed so that a live client reconnects
+            logging.info(f"Dropping WebSocket on chat {chat_id}: {type(e).__name__}")
+            self.disconnect(websocket, chat_id)
+            try:
+                await asyncio.wait_for(websocket.close(code=status.WS_1011_INTERNAL_ERROR), self.send_timeout)
+            except Exception:
+                # Already closed, or too stalled to take the close frame
+                pass
+    
+    async def send_restart(self, websocket: WebSocket):
+        """Tell a client to reconnect after a jittered delay, then close."""
+        try:
+            await websocket.send_json({"type": "reconnect", "retry_after_ms": drain_controller.reconnect_after_ms()})
+            await websocket.close(code=status.WS_1012_SERVICE_RESTART, reason="Server restarting")
+        except Exception:
+            # Already gone
+            pass
+    
+    async def close_all(self):
+        """Send every socket a reconnect hint and close it, for drain."""
+        sockets = [websocket for connections in self.active_connections.values() for websocket in connections]
+        logging.info(f"Closing {len(sockets)} WebSockets for restart")
+        await asyncio.gather(*(self.send_restart(websocket) for websocket in sockets))
+    
     async def broadcast(self, chat_id: str, message: dict):
         if chat_id in self.active_connections:
-            for connection in self.active_connections[chat_id]:
-                await connection.send_json(message)
+            started = time.perf_counter()
+            connections = list(self.active_connections[chat_id])
+            with tracer.span("ConnectionManager.broadcast", chat_id=chat_id, fanout=len(connections)):
+                for connection in connections:
+                    await self._send(connection, chat_id, message)
+            websocket_broadcast_duration.observe(time.perf_counter() - started)
+            websocket_broadcast_fanout.observe(len(connections))
+
+manager = ConnectionManager(
+    max_connections=settings.WS_MAX_CONNECTIONS,
+    send_timeout=settings.WS_SEND_TIMEOUT_SECONDS,
+)
+drain_controller.add_hook(manager.close_all)
 
-manager = ConnectionManager()
+# One unlabelled series: per-chat labels would grow with every open chat and
+# expose chat ids; per-chat sizes are in websocket_broadcast_fanout
+metrics.gauge(
+    "websocket_connections",
+    "Open WebSocket connections.",
+    collect=lambda: [((), manager.connection_count)],
+)
 
 @router.websocket("/ws/{chat_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
-    chat_id: str,
-    db: Session = Depends(get_db)
+    chat_id: str
 ):
+    registered = False
     try:
         # Get token from query parameters
         query_params = dict(websocket.query_params)
@@ -78,101 +146,143 @@ async def websocket_endpoint(
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
             
-        # Get the user
-        user = db.query(User).filter(User.username == username).first()
-        if user is None:
+        # Authenticate once; only the user id is kept for the socket's lifetime,
+        # so no session or pooled connection is held between messages
+        with SessionLocal() as db:
+            user_id = db.query(User.id).filter(User.username == username).scalar()
+        if user_id is None:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
         
-        # Check chat access
-        chat = db.query(Chat).filter(Chat.id == chat_id).first()
+        # Check chat access on the shard holding the user's chats
+        shard_engine = shard_router.engine_for(user_id)
+        with shard_router.session_for(user_id) as shard_db:
+            chat = await ChatDAL(shard_db).get_chat(chat_id, user_id)
         if not chat:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-            
-        if chat.account_id != user.id:
-            # Check if this is a public chat or the user has access
-            # Add your access control logic here
+            # Missing, or owned by another account
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
         
-        # Accept the connection if all checks pass
-        await websocket.accept()
-        
-        # Register connection with connection manager
-        await manager.connect(websocket, chat_id, user.id)
+        # Accept and register the connection if all checks pass
+        if not await manager.connect(websocket, chat_id, user_id):
+            return
+        registered = True
         
         # Handle messages
-        groq_service = GroqService()
+        groq_service = get_llm_service()
         
         while True:
-            data = await websocket.receive_text()
+            # Clients must send something, at least a heartbeat, within the idle timeout
+            try:
+                data = await asyncio.wait_for(websocket.receive_text(), settings.WS_IDLE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                await websocket.close(code=status.WS_1001_GOING_AWAY, reason="Idle timeout")
+                return
             message_data = json.loads(data)
             
-            # Create user message with both old and new fields
-            user_message = Message(
-                id=str(uuid.uuid4()),
-                chat_id=chat_id,
-                user_id=user.id,
-                question=message_data.get("content", ""),  # Old field
-                content=message_data.get("content", ""),   # New field
-                message_type="text",
-                role="user",                              # New field
-                sender_id=user.id                         # New field
-            )
+            if message_data.get("type") == "ping":
+                await websocket.send_json({"type": "pong"})
+                continue
             
-            db.add(user_message)
-            db.commit()
+            # No new work while draining; the socket is closed once in-flight replies are out
+            if drain_controller.draining:
+                await websocket.send_json({"type": "reconnect", "retry_after_ms": drain_controller.reconnect_after_ms()})
+                continue
             
-            # Send user message to all connected clients
-            await manager.broadcast(chat_id, {
-                "type": "message",
-                "data": {
-                    "id": user_message.id,
-                    "content": user_message.content or user_message.question,
-                    "sender_id": user_message.sender_id or user_message.user_id,
-                    "role": user_message.role or "user",
-                    "timestamp": user_message.timestamp.isoformat() if user_message.timestamp else None,
-                    "message_type": user_message.message_type
-                }
-            })
+            @traced("WS /ws/{chat_id}")
+            async def handle_message():
+                async with drain_controller.work():
+                    return await generate_reply()
             
-            # Get AI response
-            ai_response = await groq_service.generate_response(
-                message_data.get("content", "")
-            )
-            
-            # Create AI message with both old and new fields
-            ai_message = Message(
-                id=str(uuid.uuid4()),
-                chat_id=chat_id,
-                user_id=None,                  # Old field
-                response=ai_response,          # Old field
-                content=ai_response,           # New field
-                response_id=str(uuid.uuid4()),
-                message_type="text",
-                role="assistant",              # New field
-                sender_id="AI"                 # New field
-            )
+            async def generate_reply():
+                # Create user message
+                user_message = Message(
+                    id=new_id(),
+                    chat_id=chat_id,
+                    user_id=user_id,
+                    content=message_data.get("content", ""),
+                    message_type="text",
+                    role="user",
+                    sender_id=user_id
+                )
+                
+                with tracer.span("message_batcher.commit"):
+                    await message_batcher.submit(user_message, shard_engine)
+                
+                # Send user message to all connected clients
+                user_payload = {
+                    "type": "message",
+                    "data": {
+                        "id": user_message.id,
+                        "content": user_message.content,
+                        "sender_id": user_message.sender_id,
+                        "role": user_message.role,
+                        "timestamp": user_message.timestamp.isoformat() if user_message.timestamp else None,
+                        "message_type": user_message.message_type
+                    }
+                }
+                await manager.broadcast(chat_id, user_payload)
+                
+                # Get AI response; on shutdown a partial response is kept
+                ai_response, _ = await drain_controller.generate(
+                    groq_service,
+                    message_data.get("content", "")
+                )
+                
+                # Create AI message
+                ai_message = Message(
+                    id=new_id(),
+                    chat_id=chat_id,
+                    user_id=None,
+                    content=ai_response,
+                    response_id=new_id(),
+                    message_type="text",
+                    role="assistant",
+                    sender_id="AI"
+                )
+                
+                with tracer.span("message_batcher.commit"):
+                    await message_batcher.submit(ai_message, shard_engine)
+                
+                # Send AI message to all connected clients
+                ai_payload = {
+                    "type": "message",
+                    "data": {
+                        "id": ai_message.id,
+                        "content": ai_message.content,
+                        "sender_id": ai_message.sender_id,
+                        "role": ai_message.role,
+                        "timestamp": ai_message.timestamp.isoformat() if ai_message.timestamp else None,
+                        "message_type": ai_message.message_type
+                    }
+                }
+                await manager.broadcast(chat_id, ai_payload)
+                
+                return [user_payload, ai_payload]
             
-            db.add(ai_message)
-            db.commit()
+            # A re-sent frame with a known idempotency key is answered from the
+            # store and only echoed back to the sender
+            idempotency_key = message_data.get("idempotency_key")
+            if not idempotency_key:
+                await handle_message()
+                continue
             
-            # Send AI message to all connected clients
-            await manager.broadcast(chat_id, {
-                "type": "message",
-                "data": {
-                    "id": ai_message.id,
-                    "content": ai_message.content or ai_message.response,
-                    "sender_id": ai_message.sender_id,
-                    "role": ai_message.role or "assistant",
-                    "timestamp": ai_message.timestamp.isoformat() if ai_message.timestamp else None,
-                    "message_type": ai_message.message_type
-                }
-            })
+            key = f"ws:{user_id}:{chat_id}:{idempotency_key}"
+            is_retry = idempotency_store.contains(key)
+            payloads = await idempotency_store.run(key, handle_message)
+            if is_retry:
+                for payload in payloads:
+                    await websocket.send_json(payload)
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket, chat_id)
+        pass
     except Exception as e:
         logging.error(f"WebSocket error: {str(e)}")
-        await websocket.close() 
\ No newline at end of file
+        try:
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        except Exception:
+            # Already closed by the peer
+            pass
+    finally:
+        if registered:
+            manager.disconnect(websocket, chat_id) 
\ No newline at end of file
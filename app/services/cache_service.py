@@ -1,12 +1,17 @@
+from collections import OrderedDict
+from datetime import datetime
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from fastapi_cache.decorator import cache
 from redis.asyncio import Redis
-from typing import Optional, Any
+from typing import Optional, Any, Dict
 import hashlib
 import json
+import logging
+import time
 
 from app.config import settings
+from app.services.metrics_service import cache_requests
 
 class CacheService:
     def __init__(self, redis_url: str):
@@ -36,4 +41,96 @@ class CacheService:
         if not expire:
             expire = settings.CACHE_EXPIRE_SECONDS
         
-        return cache(expire=expire) 
\ No newline at end of file
+        return cache(expire=expire) 
+
+
+class ChatCache:
+    """Cache of chat metadata rows keyed by chat id.
+    
+    Writes go through the DAL, which refreshes or invalidates the entry on
+    every change, so a cached read is never older than the last committed
+    write. The in-memory backend is per process; set CHAT_CACHE_BACKEND to
+    "redis" to share entries and invalidations between workers.
+    """
+    
+    def __init__(self, backend: str, ttl_seconds: int, max_entries: int, redis_url: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.redis = Redis.from_url(redis_url) if backend == "redis" else None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+    
+    @staticmethod
+    def _key(chat_id: str) -> str:
+        return f"chat:{chat_id}"
+    
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, datetime):
+            return {"__datetime__": value.isoformat()}
+        raise TypeError(f"Cannot cache {type(value).__name__}")
+    
+    @staticmethod
+    def _decode(obj):
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        return obj
+    
+    async def get(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self._key(chat_id))
+            except Exception as e:
+                logging.warning(f"Chat cache read failed: {str(e)}")
+                return None
+            data = json.loads(raw, object_hook=self._decode) if raw else None
+            cache_requests.inc(cache="chat", result="hit" if data is not None else "miss")
+            return data
+        
+        entry = self._entries.get(chat_id)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[chat_id]
+            entry = None
+        cache_requests.inc(cache="chat", result="hit" if entry is not None else "miss")
+        if entry is None:
+            return None
+        self._entries.move_to_end(chat_id)
+        return entry[1]
+    
+    async def set(self, chat_id: str, data: Dict[str, Any]):
+        if self.redis is not None:
+            try:
+                await self.redis.set(
+                    self._key(chat_id),
+                    json.dumps(data, default=self._encode),
+                    ex=self.ttl_seconds,
+                )
+            except Exception as e:
+                logging.warning(f"Chat cache write failed: {str(e)}")
+            return
+        
+        self._entries[chat_id] = (time.monotonic() + self.ttl_seconds, data)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def invalidate(self, chat_id: str):
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._key(chat_id))
+            except Exception as e:
+                # A stale entry would outlive the write, so surface this
+                logging.error(f"Chat cache invalidation failed for {chat_id}: {str(e)}")
+            return
+        
+        self._entries.pop(chat_id, None)
+    
+    def clear(self):
+        self._entries.clear()
+
+
+chat_cache = ChatCache(
+    backend=settings.CHAT_CACHE_BACKEND,
+    ttl_seconds=settings.CACHE_EXPIRE_SECONDS,
+    max_entries=settings.CHAT_CACHE_MAX_ENTRIES,
+    redis_url=settings.REDIS_URL,
+)
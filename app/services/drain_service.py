@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import math
+import random
+import signal
+import threading
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from app.config import settings
+
+INTERRUPTED_NOTE = "[Response interrupted by a server restart. Please ask again.]"
+
+
+class DrainController:
+    """Graceful shutdown for sockets and in-flight LLM generations.
+
+    On SIGTERM the process stops taking new work (new sockets, messages and
+    add-message calls are turned away with a reconnect hint). Generations
+    already running get until the drain timeout to finish. Any still running
+    after that are cancelled, and whatever text they streamed so far is
+    persisted as the reply. Drain hooks then run (closing sockets with a
+    jittered reconnect delay), and the server's own SIGTERM handler is called
+    to exit.
+    """
+
+    def __init__(self, timeout: float, grace: float, reconnect_min_ms: int, reconnect_max_ms: int):
+        self.timeout = timeout
+        self.grace = grace
+        self.reconnect_min_ms = reconnect_min_ms
+        self.reconnect_max_ms = reconnect_max_ms
+        self.draining = False
+        self._generations: Set[asyncio.Task] = set()
+        self._work = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._hooks: List[Callable[[], Awaitable[None]]] = []
+        self._drained: Optional[asyncio.Task] = None
+        self._signal_task: Optional[asyncio.Task] = None
+
+    def reconnect_after_ms(self) -> int:
+        """Randomized reconnect delay, so clients don't all return at once."""
+        return random.randint(self.reconnect_min_ms, self.reconnect_max_ms)
+
+    def retry_after_seconds(self) -> int:
+        """Jittered delay for an HTTP Retry-After header."""
+        return math.ceil(self.reconnect_after_ms() / 1000)
+
+    def add_hook(self, hook: Callable[[], Awaitable[None]]):
+        """Register a coroutine function to run once in-flight work is done."""
+        self._hooks.append(hook)
+
+    @asynccontextmanager
+    async def work(self):
+        """Mark a unit of request work that drain waits for."""
+        self._work += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._work -= 1
+            if self._work == 0:
+                self._idle.set()
+
+    async def generate(self, llm_service, message_text, chat_history=None) -> Tuple[str, bool]:
+        """Run an LLM call that drain may cut short; returns (text, interrupted)."""
+        partial: List[str] = []
+        task = asyncio.ensure_future(llm_service.generate_response(message_text, chat_history, partial=partial))
+        self._generations.add(task)
+        try:
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            self._generations.discard(task)
+
+        if task.cancelled():
+            text = "".join(partial).strip()
+            return (f"{text}\n\n{INTERRUPTED_NOTE}" if text else INTERRUPTED_NOTE), True
+        return task.result(), False
+
+    async def drain(self):
+        """Drain the process; safe to call more than once."""
+        if self._drained is None:
+            self._drained = asyncio.ensure_future(self._drain())
+        await self._drained
+
+    async def _drain(self):
+        self.draining = True
+        logging.info(f"Draining: waiting up to {self.timeout}s for {len(self._generations)} generations")
+        if self._generations:
+            await asyncio.wait(set(self._generations), timeout=self.timeout)
+        if self._generations:
+            logging.info(f"Draining: checkpointing {len(self._generations)} unfinished generations")
+            for task in self._generations:
+                task.cancel()
+
+        # Let handlers persist and broadcast what they have
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.grace)
+        except asyncio.TimeoutError:
+            logging.warning(f"Draining: {self._work} requests still running after {self.grace}s")
+
+        for hook in self._hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logging.error(f"Drain hook failed: {str(e)}")
+        logging.info("Drain complete")
+
+    def install_signal_handler(self):
+        """Drain on SIGTERM before handing the signal to the previous handler."""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def forward(signum, frame):
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                signal.signal(signum, signal.SIG_DFL)
+                signal.raise_signal(signum)
+
+        async def drain_then_forward(signum, frame):
+            try:
+                await self.drain()
+            finally:
+                forward(signum, frame)
+
+        def start(signum, frame):
+            self._signal_task = loop.create_task(drain_then_forward(signum, frame))
+
+        def handle(signum, frame):
+            if self.draining:
+                # A second SIGTERM skips the rest of the drain
+                forward(signum, frame)
+                return
+            self.draining = True
+            loop.call_soon_threadsafe(start, signum, frame)
+
+        signal.signal(signal.SIGTERM, handle)
+
+
+drain_controller = DrainController(
+    timeout=settings.DRAIN_TIMEOUT_SECONDS,
+    grace=settings.DRAIN_GRACE_SECONDS,
+    reconnect_min_ms=settings.RECONNECT_MIN_MS,
+    reconnect_max_ms=settings.RECONNECT_MAX_MS,
+)
@@ -1,17 +1,31 @@
+import asyncio
 import os
-from groq import Groq
+import random
+import time
+from groq import AsyncGroq
 import logging
 
+from app.config import settings
+from app.services.metrics_service import llm_response_duration, llm_time_to_first_token
+from app.services.tracing_service import current_span, traced
+
 class GroqService:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, http_client=None):
         """Initialize Groq client with API key from environment variable or passed directly."""
         self.api_key = api_key or os.environ.get("GROQ_API_KEY", "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")
-        self.client = Groq(api_key=self.api_key)
+        # Async client: the stream yields to the event loop between chunks, so
+        # other requests keep running and a generation can be cancelled mid-stream
+        self.client = AsyncGroq(api_key=self.api_key, http_client=http_client)
         self.model = "llama-3.3-70b-versatile"  # Default model
         logging.info("GroqService initialized")
 
-    async def generate_response(self, message_text, chat_history=None):
-        """Generate a response to a message using Groq API."""
+    @traced("GroqService.generate_response")
+    async def generate_response(self, message_text, chat_history=None, partial=None):
+        """Generate a response to a message using Groq API.
+        
+        Streamed chunks are also appended to `partial`, when given, so a
+        cancelled generation can be checkpointed.
+        """
         try:
             messages = []
             
@@ -30,14 +44,96 @@ class GroqService:
                 "content": message_text
             })
             
-            # Make the API call
-            completion = self.client.chat.completions.create(
+            # Make the API call, streamed so the first token can be timed
+            started = time.perf_counter()
+            stream = await self.client.chat.completions.create(
                 messages=messages,
                 model=self.model,
+                stream=True,
             )
             
-            return completion.choices[0].message.content
+            parts = partial if partial is not None else []
+            async with stream:
+                async for chunk in stream:
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if content:
+                        if not parts:
+                            first_token = time.perf_counter() - started
+                            llm_time_to_first_token.observe(first_token, model=self.model)
+                            current_span().set_attribute("time_to_first_token_ms", round(first_token * 1000, 2))
+                        parts.append(content)
+            llm_response_duration.observe(time.perf_counter() - started, model=self.model)
+            current_span().set_attribute("model", self.model)
+            
+            return "".join(parts)
             
         except Exception as e:
             logging.error(f"Error generating response from Groq: {str(e)}")
-            return "Sorry, I couldn't generate a response at this time." 
\ No newline at end of file
+            return "Sorry, I couldn't generate a response at this time." 
+    
+    async def close(self):
+        """Close the client's connection pool."""
+        await self.client.close()
+
+
+class FakeGroqService:
+    """Local stand-in for GroqService used for benchmarks and load tests.
+    
+    Waits FAKE_LLM_LATENCY_MS for the first token and then streams
+    FAKE_LLM_RESPONSE_TOKENS tokens at FAKE_LLM_TOKENS_PER_SECOND. The text is
+    seeded from the prompt, so repeated runs produce the same responses.
+    """
+    
+    WORDS = (
+        "the", "branch", "message", "chat", "history", "context", "model", "answer",
+        "question", "latency", "token", "stream", "database", "index", "query", "cache",
+    )
+    
+    def __init__(self):
+        self.latency = settings.FAKE_LLM_LATENCY_MS / 1000
+        self.tokens = settings.FAKE_LLM_RESPONSE_TOKENS
+        self.tokens_per_second = settings.FAKE_LLM_TOKENS_PER_SECOND
+    
+    @traced("FakeGroqService.generate_response")
+    async def generate_response(self, message_text, chat_history=None, partial=None):
+        """Generate a deterministic response after the configured delay."""
+        rng = random.Random(message_text)
+        words = [rng.choice(self.WORDS) for _ in range(self.tokens)]
+        parts = partial if partial is not None else []
+        
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency)
+        llm_time_to_first_token.observe(time.perf_counter() - started, model="fake")
+        if self.tokens_per_second > 0:
+            for word in words:
+                parts.append(word + " ")
+                await asyncio.sleep(1 / self.tokens_per_second)
+        llm_response_duration.observe(time.perf_counter() - started, model="fake")
+        
+        return " ".join(words)
+    
+    async def close(self):
+        pass
+
+
+_llm_service = None
+
+
+def get_llm_service():
+    """The LLM client selected by LLM_BACKEND ("groq" or "fake").
+    
+    Built on first use and shared, so every generation reuses one connection
+    pool (and its TLS sessions) to the API.
+    """
+    global _llm_service
+    if _llm_service is None:
+        _llm_service = FakeGroqService() if settings.LLM_BACKEND == "fake" else GroqService()
+    return _llm_service
+
+
+async def close_llm_service():
+    """Close the shared LLM client, if one was built."""
+    global _llm_service
+    if _llm_service is not None:
+        service, _llm_service = _llm_service, None
+        await service.close()
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from app.config import settings
+
+
+class _Entry:
+    __slots__ = ("future", "created_at")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.created_at = time.monotonic()
+
+
+class IdempotencyStore:
+    """Bounded in-process store mapping idempotency keys to results.
+
+    The first caller for a key runs the work; concurrent retries attach to the
+    in-flight future and later retries get the stored result back. Failed work
+    is forgotten so that a retry can try again.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.future.done() and time.monotonic() - entry.created_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry: _Entry):
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            # Evicting an in-flight entry only stops new retries from attaching;
+            # callers already awaiting it still get the result.
+            self._entries.popitem(last=False)
+
+    def contains(self, key: str) -> bool:
+        """Return whether a live entry exists for the key."""
+        return self._lookup(key) is not None
+
+    async def run(self, key: Optional[str], work: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `work` once per key and share its result with every retry."""
+        if not key:
+            return await work()
+
+        entry = self._lookup(key)
+        while entry is not None:
+            try:
+                # Shield so a retry giving up does not cancel the original work
+                return await asyncio.shield(entry.future)
+            except asyncio.CancelledError:
+                if not entry.future.cancelled():
+                    raise
+                # The original attempt was cancelled, so this retry takes over
+                entry = self._lookup(key)
+
+        entry = _Entry(asyncio.get_running_loop().create_future())
+        self._store(key, entry)
+        try:
+            result = await work()
+        except BaseException as e:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            if isinstance(e, asyncio.CancelledError):
+                entry.future.cancel()
+            else:
+                entry.future.set_exception(e)
+                # Mark the exception as retrieved when no retry is waiting on it
+                entry.future.exception()
+            raise
+
+        entry.future.set_result(result)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+
+idempotency_store = IdempotencyStore(
+    max_entries=settings.IDEMPOTENCY_MAX_KEYS,
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+)
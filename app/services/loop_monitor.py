@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.config import settings
+from app.services.metrics_service import event_loop_blocked, event_loop_lag
+
+
+class LoopMonitor:
+    """Measures event-loop lag and, optionally, reports blocking callbacks.
+
+    The lag sampler sleeps for `interval` seconds and records how much later
+    than requested it woke up. The blocking detector is a watchdog thread that
+    pings the loop; when a ping is not answered within `blocking_threshold`
+    seconds, it captures the loop thread's stack, which shows the call that
+    is holding the loop.
+    """
+
+    def __init__(self, interval: float, warn_threshold: float, detect_blocking: bool, blocking_threshold: float):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.detect_blocking = detect_blocking
+        self.blocking_threshold = blocking_threshold
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start monitoring the running loop."""
+        loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self._task = loop.create_task(self._sample())
+        if self.detect_blocking:
+            self._watchdog = threading.Thread(
+                target=self._watch,
+                args=(loop, threading.get_ident()),
+                name="loop-watchdog",
+                daemon=True,
+            )
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # The watchdog is a daemon thread and exits at its next check
+        self._watchdog = None
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            event_loop_lag.observe(lag)
+            if lag >= self.warn_threshold:
+                logging.warning(f"Event loop lagged {lag * 1000:.0f}ms")
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int):
+        while not self._stopped.is_set():
+            answered = threading.Event()
+            started = time.monotonic()
+            try:
+                loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                # Loop closed
+                return
+
+            if not answered.wait(self.blocking_threshold):
+                frame = sys._current_frames().get(loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+                while not answered.wait(1) and not self._stopped.is_set():
+                    pass
+                duration = time.monotonic() - started
+                event_loop_blocked.inc()
+                logging.warning(f"Event loop blocked for at least {duration * 1000:.0f}ms in:\n{stack}")
+
+            self._stopped.wait(self.blocking_threshold)
+
+
+loop_monitor = LoopMonitor(
+    interval=settings.LOOP_LAG_INTERVAL_MS / 1000,
+    warn_threshold=settings.LOOP_LAG_WARN_MS / 1000,
+    detect_blocking=settings.LOOP_BLOCKING_DETECTOR,
+    blocking_threshold=settings.LOOP_BLOCKING_THRESHOLD_MS / 1000,
+)
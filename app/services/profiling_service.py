@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profiling run is already in progress on this worker."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class ProfilingService:
+    """On-demand sampling profiler and allocation tracer for a live worker.
+
+    A background thread samples every thread's stack with
+    sys._current_frames, so the event loop keeps serving traffic while it is
+    being profiled. Samples are folded into collapsed stacks
+    ("root;caller;callee count"), the input format of flamegraph.pl and
+    speedscope. Only one run at a time is allowed per process.
+    """
+
+    def __init__(self):
+        self._running = False
+
+    async def profile(self, seconds: float, interval: float, allocations: bool = False, top: int = 25) -> Dict:
+        if self._running:
+            raise ProfilerBusy()
+        self._running = True
+        started_tracing = False
+        try:
+            if allocations and not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                started_tracing = True
+            samples = await asyncio.to_thread(self._sample, seconds, interval)
+            result = {
+                "seconds": seconds,
+                "interval_ms": interval * 1000,
+                "samples": sum(samples.values()),
+                "collapsed": "\n".join(f"{stack} {count}" for stack, count in samples.most_common()),
+            }
+            if allocations:
+                result["allocations"] = self._top_allocations(top)
+            return result
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self._running = False
+
+    def _sample(self, seconds: float, interval: float) -> Counter:
+        samples: Counter = Counter()
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != me:
+                    samples[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+            time.sleep(interval)
+        return samples
+
+    def _top_allocations(self, top: int) -> List[Dict]:
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        return [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:top]
+        ]
+
+
+profiling_service = ProfilingService()
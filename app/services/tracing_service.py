@@ -0,0 +1,204 @@
+import functools
+import inspect
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.db.query_stats import current_stats
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start_time = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    @property
+    def sampled(self) -> bool:
+        return True
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+
+class _UnsampledSpan:
+    """Stand-in for every span of a trace that was not sampled."""
+
+    name = trace_id = span_id = parent_id = None
+    sampled = False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+UNSAMPLED = _UnsampledSpan()
+
+_current_span: ContextVar[Optional[Any]] = ContextVar("current_span", default=None)
+
+
+class LogExporter:
+    """Write each finished span as one log line."""
+
+    def export(self, span: Span):
+        attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+        error = f" error={span.error}" if span.error else ""
+        logging.info(
+            f"span trace={span.trace_id} id={span.span_id} parent={span.parent_id} "
+            f"name={span.name} duration_ms={span.duration * 1000:.2f}{error} {attributes}".rstrip()
+        )
+
+
+class InMemoryExporter:
+    """Keep the most recent finished spans, for tests and debugging."""
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self._spans.append(span)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        return [span for span in self._spans if trace_id is None or span.trace_id == trace_id]
+
+    def clear(self):
+        self._spans.clear()
+
+
+EXPORTERS = {"log": LogExporter, "memory": InMemoryExporter}
+
+
+class Tracer:
+    """Creates spans that nest along the async call chain.
+
+    The sampling decision is made once per trace, at its root span, so a
+    trace is either recorded completely or not at all. Child tasks inherit
+    the current span through their copied context.
+    """
+
+    def __init__(self, sample_rate: float, exporters: List[Any]):
+        self.sample_rate = sample_rate
+        self.exporters = exporters
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parent = _current_span.get()
+        if parent is None:
+            if random.random() >= self.sample_rate:
+                token = _current_span.set(UNSAMPLED)
+                try:
+                    yield UNSAMPLED
+                finally:
+                    _current_span.reset(token)
+                return
+            span = Span(name, os.urandom(16).hex(), None, attributes)
+        elif not parent.sampled:
+            yield UNSAMPLED
+            return
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+
+        # Statements run inside the span, when the request is counting them
+        stats = current_stats()
+        statements, db_time = (stats.statements, stats.db_time) if stats is not None else (0, 0.0)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.finish()
+            if stats is not None and stats.statements > statements:
+                span.attributes["db_statements"] = stats.statements - statements
+                span.attributes["db_time_ms"] = round((stats.db_time - db_time) * 1000, 2)
+            _current_span.reset(token)
+            self._export(span)
+
+    def _export(self, span: Span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logging.error(f"Span exporter {type(exporter).__name__} failed: {str(e)}")
+
+
+tracer = Tracer(
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    exporters=[EXPORTERS[name]() for name in settings.TRACE_EXPORTERS],
+)
+
+
+def current_span():
+    """The innermost active span, or UNSAMPLED outside a recorded trace."""
+    return _current_span.get() or UNSAMPLED
+
+
+def traced(name: Optional[str] = None):
+    """Run an async function inside a span named after it."""
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def trace_methods(cls):
+    """Class decorator wrapping every public async method in a span."""
+    for attribute, value in list(vars(cls).items()):
+        if not attribute.startswith("_") and inspect.iscoroutinefunction(value):
+            setattr(cls, attribute, traced(f"{cls.__name__}.{attribute}")(value))
+    return cls
+
+
+class TracingMiddleware:
+    """Root span per HTTP request, reported back in X-Trace-Id when sampled."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with tracer.span(f"{scope['method']} {scope['path']}") as span:
+            async def send_with_trace(message: Message):
+                if message["type"] == "http.response.start" and span.sampled:
+                    span.set_attribute("status", message["status"])
+                    MutableHeaders(raw=message["headers"])["X-Trace-Id"] = span.trace_id
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                route = scope.get("route")
+                if span.sampled and route is not None:
+                    span.name = f"{scope['method']} {route.path}"
@@ -0,0 +1,235 @@
+"""NDJSON export and bulk import of an account's chats.
+
+Usage:
+    python -m app.services.transfer_service export USERNAME [-o FILE]
+    python -m app.services.transfer_service import USERNAME FILE [--new-ids]
+
+An export is a header line followed by one line per row of chats,
+conversations, messages and message_branches, parents first. It is streamed
+from the database with constant memory. Imports insert TRANSFER_BATCH_ROWS
+rows per transaction and never call the LLM. With --new-ids every id is
+replaced, so one file can be loaded many times (for example to seed load
+tests); without it the original ids are kept, as for a restore.
+"""
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set
+
+import orjson
+from sqlalchemy import Boolean, DateTime, Integer, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import settings
+from app.db.custom_types import new_id
+from app.db.rebalance_shards import account_tables
+from app.db.sharding import shard_router
+
+FORMAT_VERSION = 1
+
+# Columns holding ids that --new-ids replaces. Conversation.parent_message_id
+# refers to a response_id, which is in the same map.
+REMAPPED_COLUMNS = {
+    "chats": ("id",),
+    "conversations": ("id", "chat_id", "parent_chat_id", "parent_message_id"),
+    "messages": ("id", "chat_id", "response_id"),
+    "message_branches": ("message_id", "branch_chat_id"),
+}
+
+# Columns that must point at a row earlier in the same export, so an import
+# never links to rows it did not create
+REFERENCES = {
+    "conversations": {"chat_id": "chats"},
+    "messages": {"chat_id": "chats"},
+    "message_branches": {"message_id": "messages", "branch_chat_id": "chats"},
+}
+
+
+def _json_type(column) -> type:
+    """The JSON value type an export uses for a column."""
+    if isinstance(column.type, Boolean):
+        return bool
+    if isinstance(column.type, Integer):
+        return int
+    # Text, ids and ISO timestamps
+    return str
+
+
+class TransferService:
+    @staticmethod
+    def export_account(account_id: str, batch_size: int = settings.TRANSFER_BATCH_ROWS) -> Iterator[bytes]:
+        """Yield an account's rows as NDJSON lines, reading `batch_size` rows at a time."""
+        yield orjson.dumps({
+            "type": "header",
+            "format": FORMAT_VERSION,
+            "account_id": account_id,
+            "exported_at": datetime.utcnow(),
+        }) + b"\n"
+
+        db_engine = shard_router.engine_for(account_id)
+        with db_engine.connect().execution_options(stream_results=True, yield_per=batch_size) as conn:
+            for table, where in account_tables(account_id):
+                for row in conn.execute(select(table).where(where)).mappings():
+                    yield orjson.dumps({"type": table.name, "row": dict(row)}) + b"\n"
+
+
+class AccountImporter:
+    """Incremental NDJSON import into one account.
+
+    Feed lines with `add`; whenever `full` is set, call `flush` to write the
+    buffered rows in one transaction. `flush` is blocking, so async callers
+    run it in a thread.
+    """
+
+    def __init__(self, account_id: str, new_ids: bool = False, batch_size: int = settings.TRANSFER_BATCH_ROWS):
+        self.account_id = account_id
+        self.new_ids = new_ids
+        self.batch_size = batch_size
+        self.db_engine = shard_router.engine_for(account_id)
+        self.tables = {table.name: table for table, _ in account_tables(account_id)}
+        self.source_account_id: Optional[str] = None
+        self.counts: Dict[str, int] = {name: 0 for name in self.tables}
+        self._pending: Dict[str, List[dict]] = {name: [] for name in self.tables}
+        self._buffered = 0
+        self._id_map: Dict[str, str] = {}
+        self._imported_ids: Dict[str, Set[str]] = {"chats": set(), "messages": set()}
+
+    @property
+    def full(self) -> bool:
+        return self._buffered >= self.batch_size
+
+    def add(self, line: bytes):
+        line = line.strip()
+        if not line:
+            return
+
+        record = orjson.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("Records must be JSON objects")
+        if self.source_account_id is None:
+            if record.get("type") != "header" or record.get("format") != FORMAT_VERSION:
+                raise ValueError(f"Not a format {FORMAT_VERSION} chat export")
+            if not isinstance(record.get("account_id"), str):
+                raise ValueError("Header has no account_id")
+            self.source_account_id = record["account_id"]
+            return
+
+        table = self.tables.get(record.get("type"))
+        if table is None:
+            raise ValueError(f"Unknown record type {record.get('type')!r}")
+        row = record.get("row")
+        if not isinstance(row, dict):
+            raise ValueError(f"{table.name} record has no row object")
+        self._pending[table.name].append(self._prepare(table, row))
+        self._buffered += 1
+
+    def _prepare(self, table, row: dict) -> dict:
+        values = {}
+        for column in table.columns:
+            value = row.get(column.key)
+            if value is None:
+                if column.key in row:
+                    values[column.key] = None
+                continue
+            expected = _json_type(column)
+            # bool is an int subclass, but never a valid count
+            if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+                raise ValueError(f"{table.name}.{column.key} must be a JSON {expected.__name__}")
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            values[column.key] = value
+
+        if "account_id" in table.columns:
+            values["account_id"] = self.account_id
+        if table.name == "chats" and values.get("last_message_at") is None:
+            # Chats without messages sort by their creation time
+            values["created_at"] = values.get("created_at") or datetime.utcnow()
+            values["last_message_at"] = values["created_at"]
+        if values.get("user_id") is not None:
+            values["user_id"] = self.account_id
+        if values.get("sender_id") == self.source_account_id:
+            values["sender_id"] = self.account_id
+
+        for column in table.columns:
+            required = not column.nullable and column.default is None and column.server_default is None
+            if required and values.get(column.key) is None:
+                raise ValueError(f"{table.name} record has no {column.key}")
+        for key, target in REFERENCES.get(table.name, {}).items():
+            if values[key] not in self._imported_ids[target]:
+                raise ValueError(f"{table.name}.{key} refers to a {target} row that is not in the export")
+        if table.name in self._imported_ids and values.get("id") is not None:
+            self._imported_ids[table.name].add(values["id"])
+
+        if self.new_ids:
+            for key in REMAPPED_COLUMNS[table.name]:
+                if values.get(key) is not None:
+                    values[key] = self._id_map.setdefault(values[key], new_id())
+        return values
+
+    def flush(self):
+        """Insert everything buffered, parents first, in one transaction."""
+        if not self._buffered:
+            return
+        counts = {}
+        try:
+            # Rolled back as a whole if any row is refused
+            with self.db_engine.begin() as conn:
+                for name, rows in self._pending.items():
+                    if rows:
+                        conn.execute(insert(self.tables[name]), rows)
+                        counts[name] = len(rows)
+        except SQLAlchemyError as e:
+            raise ValueError(f"rows refused by the database: {getattr(e, 'orig', None) or e}")
+        for name, count in counts.items():
+            self.counts[name] += count
+        self._pending = {name: [] for name in self.tables}
+        self._buffered = 0
+
+
+def main():
+    import argparse
+    import logging
+    import sys
+
+    from app.db.connection import SessionLocal
+    from app.db.db import User
+    from app.db.migrations.common import configure_logging
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Write an account's chats as NDJSON")
+    export.add_argument("username")
+    export.add_argument("-o", "--output", help="File to write (default: stdout)")
+    load = subparsers.add_parser("import", help="Load an NDJSON export into an account")
+    load.add_argument("username")
+    load.add_argument("file")
+    load.add_argument("--new-ids", action="store_true", help="Give every imported row a new id")
+    args = parser.parse_args()
+
+    configure_logging()
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == args.username).first()
+    if user is None:
+        parser.error(f"No user named {args.username}")
+    shard_router.create_tables()
+
+    if args.command == "export":
+        output = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for line in TransferService.export_account(user.id):
+                output.write(line)
+        finally:
+            if args.output:
+                output.close()
+        return
+
+    importer = AccountImporter(user.id, new_ids=args.new_ids)
+    with open(args.file, "rb") as f:
+        for line in f:
+            importer.add(line)
+            if importer.full:
+                importer.flush()
+    importer.flush()
+    logging.info(f"Imported {importer.counts} into {args.username}")
+
+
+if __name__ == "__main__":
+    main()
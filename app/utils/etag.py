@@ -0,0 +1,28 @@
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+
+from app.db.db import Chat
+
+
+def chat_etag(chat: Chat, kind: str) -> str:
+    """Strong ETag for a representation of `chat` that changes with its version."""
+    return f'"{chat.id}.{chat.version}.{kind}"'
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 response when the request's If-None-Match already names `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+
+    candidates = {candidate.strip() for candidate in header.split(",")}
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    if "*" in candidates or etag in candidates or f"W/{etag}" in candidates:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def etag_response(content, etag: str) -> ORJSONResponse:
+    return ORJSONResponse(content, headers={"ETag": etag})
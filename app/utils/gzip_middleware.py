@@ -0,0 +1,77 @@
+import gzip
+from typing import Iterable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class CompressionMiddleware:
+    """Gzip complete responses of an allowed content type and minimum size.
+
+    Only responses sent in a single body message are compressed. Streaming
+    responses (SSE, NDJSON exports) are forwarded chunk by chunk untouched,
+    so they are never buffered. Strong ETags are weakened on compressed
+    responses, because the encoded bytes differ from the identity ones;
+    If-None-Match handling compares weakly, so revalidation keeps working.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int, compress_level: int, content_types: Iterable[str]):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compress_level = compress_level
+        self.content_types = tuple(content_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._accepts_gzip(Headers(scope=scope)):
+            await self.app(scope, receive, send)
+            return
+
+        start: Message = {}
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 304)
+                    or not headers.get("content-type", "").startswith(self.content_types)
+                )
+                if passthrough:
+                    await send(message)
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or small: send as is, never buffer
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = gzip.compress(body, compresslevel=self.compress_level)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = "gzip"
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _accepts_gzip(headers: Headers) -> bool:
+        for coding in headers.get("accept-encoding", "").split(","):
+            name, _, params = coding.partition(";")
+            if name.strip().lower() in ("gzip", "*"):
+                return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+        return False
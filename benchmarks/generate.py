@@ -0,0 +1,194 @@
+"""Synthetic chat data for benchmarks and load tests.
+
+Usage:
+    python -m benchmarks.generate [--accounts 10] [--chats 20] [--messages 200]
+                                  [--depth 3] [--fanout 2] [--seed 1] [--output DIR]
+
+Creates users bench-0 .. bench-N (password "bench") and loads each one's
+chats through the bulk importer, with no LLM calls. Every chat gets a branch
+tree `--depth` levels deep with `--fanout` branches per level; branches copy
+the messages before their branch point, as create-branch does. With
+--output, the data is written as one NDJSON export per account instead.
+Output depends only on the arguments, so runs are comparable across commits.
+"""
+import argparse
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+import orjson
+
+from app.db.connection import SessionLocal
+from app.db.custom_types import new_id
+from app.db.db import User, create_tables, message_preview
+from app.db.sharding import shard_router
+from app.services.transfer_service import FORMAT_VERSION, AccountImporter
+from app.utils.security import get_password_hash
+
+VOCABULARY = (
+    "branch", "message", "history", "context", "answer", "question", "latency", "token",
+    "stream", "database", "index", "query", "cache", "shard", "vector", "prompt", "model",
+    "deploy", "review", "schema", "migration", "replica", "cursor", "socket", "payload",
+)
+START = datetime(2025, 1, 1)
+
+
+class AccountGenerator:
+    """Export-format records for one synthetic account, parents first."""
+
+    def __init__(self, seed: int, chats: int, messages: int, depth: int, fanout: int):
+        self.rng = random.Random(seed)
+        self.chats = chats
+        self.messages = messages
+        self.depth = depth
+        self.fanout = fanout
+        self.account_id = self._uuid()
+        self.clock = START
+
+    def _uuid(self) -> str:
+        return "%08x-%04x-7%03x-%04x-%012x" % (
+            self.rng.getrandbits(32), self.rng.getrandbits(16), self.rng.getrandbits(12),
+            0x8000 | self.rng.getrandbits(14), self.rng.getrandbits(48),
+        )
+
+    def _text(self) -> str:
+        # Mostly short turns, with the occasional long one over the compression threshold
+        words = self.rng.choice((8, 20, 40, 400))
+        return " ".join(self.rng.choice(VOCABULARY) for _ in range(words))
+
+    def _tick(self) -> str:
+        self.clock += timedelta(seconds=self.rng.randint(1, 90))
+        return self.clock.isoformat()
+
+    def records(self) -> Iterator[dict]:
+        yield {"type": "header", "format": FORMAT_VERSION, "account_id": self.account_id}
+        for index in range(self.chats):
+            messages = [self._message(role) for _ in range(self.messages // 2) for role in ("user", "assistant")]
+            yield from self._chat(f"Chat {index}", messages, parent=None, level=0)
+
+    def _message(self, role: str) -> dict:
+        return {
+            "id": self._uuid(),
+            "user_id": self.account_id if role == "user" else None,
+            "content": self._text(),
+            "role": role,
+            "sender_id": self.account_id if role == "user" else "AI",
+            "response_id": self._uuid(),
+            "message_type": "text",
+            "timestamp": self._tick(),
+        }
+
+    def _chat(self, name: str, messages: List[dict], parent, level: int) -> Iterator[dict]:
+        chat_id = self._uuid()
+        last = messages[-1] if messages else None
+        yield {"type": "chats", "row": {
+            "id": chat_id,
+            "name": name,
+            "chat_type": "branch" if parent else "direct",
+            "account_id": self.account_id,
+            "created_at": messages[0]["timestamp"] if messages else self._tick(),
+            "updated_at": last["timestamp"] if last else None,
+            "active": True,
+            "last_message_at": last["timestamp"] if last else None,
+            "last_message_preview": message_preview(last["content"]) if last else None,
+            "message_count": len(messages),
+            "version": 0,
+        }}
+        yield {"type": "conversations", "row": {
+            "id": self._uuid(),
+            "chat_id": chat_id,
+            "account_id": self.account_id,
+            "name": name,
+            "parent_chat_id": parent["chat_id"] if parent else None,
+            "parent_message_id": parent["response_id"] if parent else None,
+            "deleted": False,
+        }}
+        for message in messages:
+            yield {"type": "messages", "row": dict(message, chat_id=chat_id)}
+        if parent:
+            yield {"type": "message_branches", "row": {"message_id": parent["message_id"], "branch_chat_id": chat_id}}
+
+        if level >= self.depth:
+            return
+        assistant_turns = [i for i, message in enumerate(messages) if message["role"] == "assistant"]
+        for branch in range(min(self.fanout, len(assistant_turns))):
+            point = self.rng.choice(assistant_turns)
+            # create-branch copies the messages before the branch point under new ids
+            copied = [dict(message, id=self._uuid(), response_id=self._uuid()) for message in messages[:point]]
+            branch_parent = {
+                "chat_id": chat_id,
+                "message_id": messages[point]["id"],
+                "response_id": messages[point]["response_id"],
+            }
+            yield from self._chat(f"{name} / {branch}", copied, branch_parent, level + 1)
+
+
+def ndjson(records: Iterator[dict]) -> Iterator[bytes]:
+    for record in records:
+        yield orjson.dumps(record) + b"\n"
+
+
+def load_account(username: str, records: Iterator[dict]) -> Dict[str, int]:
+    """Create `username` if needed and bulk-import `records` into it."""
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            user = User(
+                id=new_id(),
+                username=username,
+                email=f"{username}@bench.invalid",
+                hashed_password=get_password_hash("bench"),
+            )
+            db.add(user)
+            db.commit()
+        account_id = user.id
+
+    importer = AccountImporter(account_id, new_ids=True)
+    for line in ndjson(records):
+        importer.add(line)
+        if importer.full:
+            importer.flush()
+    importer.flush()
+    return importer.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--chats", type=int, default=20, help="Top-level chats per account")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per top-level chat")
+    parser.add_argument("--depth", type=int, default=3, help="Levels of branches below each chat")
+    parser.add_argument("--fanout", type=int, default=2, help="Branches per chat at each level")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write NDJSON exports to this directory instead of the database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    else:
+        create_tables()
+        shard_router.create_tables()
+
+    totals: Dict[str, int] = {}
+    for index in range(args.accounts):
+        username = f"bench-{index}"
+        generator = AccountGenerator(args.seed * 100003 + index, args.chats, args.messages, args.depth, args.fanout)
+        if args.output:
+            with open(os.path.join(args.output, f"{username}.ndjson"), "wb") as f:
+                f.writelines(ndjson(generator.records()))
+            continue
+
+        counts = load_account(username, generator.records())
+        for table, count in counts.items():
+            totals[table] = totals.get(table, 0) + count
+        logging.info(f"{username}: {counts}")
+
+    if not args.output:
+        logging.info(f"Loaded {totals}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""End-to-end benchmark scenarios against a running server.
+
+Usage:
+    LLM_BACKEND=fake FAKE_LLM_LATENCY_MS=0 FAKE_LLM_TOKENS_PER_SECOND=0 \\
+        uvicorn app.main:app --port 8000
+    python -m benchmarks.run [--url http://127.0.0.1:8000] [--scenarios add-message,search]
+                             [--requests 200] [--concurrency 16] [--listeners 10]
+                             [--output results.json] [--compare baseline.json] [--tolerance 0.2]
+
+Each run registers a fresh user and imports the same generated history
+(`--history` messages with a `--depth`/`--fanout` branch tree) through
+/chats/import, so runs against the same commit see the same data. Each
+scenario reports throughput and p50/p95/p99 latency. With --output the
+results are saved as JSON, together with the commit they were measured on. With
+--compare the run exits non-zero when a scenario's p95 or throughput is more
+than --tolerance worse than in the saved baseline.
+
+Scenarios: get-chat-content, search and branch-tree read the imported
+history. add-message posts to a fresh chat per worker. ws-fanout
+sends over one WebSocket and times until all --listeners sockets on the chat
+have the AI reply. Run the server with the fake LLM backend; with zero
+latency the numbers measure the service itself.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+import websockets
+
+from benchmarks.generate import AccountGenerator, ndjson
+
+SCENARIOS = ("get-chat-content", "search", "branch-tree", "add-message", "ws-fanout")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def measure(
+    name: str,
+    operation: Callable[[int], Awaitable[None]],
+    requests: int,
+    concurrency: int,
+) -> Dict[str, float]:
+    """Run `operation(worker)` `requests` times across `concurrency` workers."""
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker(index: int):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                await operation(index)
+            except Exception as e:
+                errors += 1
+                print(f"{name}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.api = args.url.rstrip("/") + "/api/v1"
+        self.ws_url = args.url.replace("http", "ws", 1).rstrip("/")
+        self.client = httpx.AsyncClient(timeout=120)
+
+    async def setup(self):
+        username = f"bench-run-{uuid.uuid4().hex[:8]}"
+        response = await self.client.post(f"{self.api}/auth/register", json={
+            "username": username, "email": f"{username}@bench.invalid", "password": "bench",
+        })
+        response.raise_for_status()
+        response = await self.client.post(f"{self.api}/auth/token", data={"username": username, "password": "bench"})
+        response.raise_for_status()
+        self.token = response.json()["access_token"]
+        self.client.headers["Authorization"] = f"Bearer {self.token}"
+
+        generator = AccountGenerator(self.args.seed, 1, self.args.history, self.args.depth, self.args.fanout)
+        response = await self.client.post(
+            f"{self.api}/chats/import",
+            content=b"".join(ndjson(generator.records())),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        response.raise_for_status()
+
+        chats = (await self.client.get(f"{self.api}/chats/list-chats")).json()
+        self.history_chat = next(chat["id"] for chat in chats if chat["name"] == "Chat 0")
+        self.worker_chats = [await self.create_chat(f"bench {index}") for index in range(self.args.concurrency)]
+
+    async def create_chat(self, name: str) -> str:
+        response = await self.client.post(f"{self.api}/chats/create-chat", json={"name": name})
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def get(self, path: str, **params):
+        response = await self.client.get(f"{self.api}{path}", params=params)
+        response.raise_for_status()
+
+    async def get_chat_content(self, worker: int):
+        await self.get("/chats/get-chat-content", chat_id=self.history_chat)
+
+    async def search(self, worker: int):
+        await self.get("/messages/search", chat_id=self.history_chat, query="latency")
+
+    async def branch_tree(self, worker: int):
+        await self.get(f"/branches/tree/{self.history_chat}")
+
+    async def add_message(self, worker: int):
+        response = await self.client.post(f"{self.api}/messages/add-message", json={
+            "chat_id": self.worker_chats[worker], "content": "benchmark question",
+        })
+        response.raise_for_status()
+
+    async def ws_fanout(self) -> Dict[str, float]:
+        chat_id = await self.create_chat("bench fanout")
+        url = f"{self.ws_url}/ws/{chat_id}?token={self.token}"
+        sockets = [await websockets.connect(url) for _ in range(self.args.listeners)]
+
+        async def wait_for_reply(socket):
+            while True:
+                payload = json.loads(await socket.recv())
+                if payload.get("data", {}).get("role") == "assistant":
+                    return
+
+        async def send(worker: int):
+            await sockets[0].send(json.dumps({"content": "benchmark fan-out"}))
+            await asyncio.wait_for(asyncio.gather(*(wait_for_reply(socket) for socket in sockets)), 60)
+
+        try:
+            # One sender: frames on a socket are handled in order
+            return await measure("ws-fanout", send, self.args.requests, 1)
+        finally:
+            for socket in sockets:
+                await socket.close()
+
+    async def run(self, scenarios: List[str]) -> Dict[str, Dict[str, float]]:
+        await self.setup()
+        operations = {
+            "get-chat-content": self.get_chat_content,
+            "search": self.search,
+            "branch-tree": self.branch_tree,
+            "add-message": self.add_message,
+        }
+        results = {}
+        try:
+            for name in scenarios:
+                if name == "ws-fanout":
+                    results[name] = await self.ws_fanout()
+                else:
+                    results[name] = await measure(name, operations[name], self.args.requests, self.args.concurrency)
+                print(f"{name:18} {json.dumps(results[name])}")
+        finally:
+            await self.client.aclose()
+        return results
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    found = []
+    for name, result in results.items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            found.append(f"{name}: throughput {before['throughput_rps']} -> {result['throughput_rps']} req/s")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--listeners", type=int, default=10, help="WebSockets on the ws-fanout chat")
+    parser.add_argument("--history", type=int, default=1000, help="Messages in the imported chat")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Save results as JSON")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(Bench(args).run(scenarios))
+    report = {
+        "commit": current_commit(),
+        "measured_at": datetime.utcnow().isoformat(),
+        "settings": {key: getattr(args, key) for key in ("requests", "concurrency", "listeners", "history", "depth", "fanout", "seed")},
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
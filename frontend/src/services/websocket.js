@@ -1,3 +1,8 @@
+// The server closes sockets that send nothing for WS_IDLE_TIMEOUT_SECONDS
+// (120s), so readers who never type keep theirs open with a heartbeat
+const HEARTBEAT_INTERVAL_MS = 30000;
+const RECONNECT_DELAY_MS = 5000;
+
 export class WebSocketService {
   constructor(chatId, token, onMessageCallback) {
     this.chatId = chatId;
@@ -5,6 +10,8 @@ export class WebSocketService {
     this.onMessageCallback = onMessageCallback;
     this.socket = null;
     this.isConnected = false;
+    this.heartbeat = null;
+    this.reconnectDelay = RECONNECT_DELAY_MS;
   }
   
   connect() {
@@ -21,10 +28,22 @@ export class WebSocketService {
     this.socket.onopen = () => {
       console.log('WebSocket connection established');
       this.isConnected = true;
+      this.reconnectDelay = RECONNECT_DELAY_MS;
+      this.heartbeat = setInterval(() => {
+        this.socket.send(JSON.stringify({ type: 'ping' }));
+      }, HEARTBEAT_INTERVAL_MS);
     };
     
     this.socket.onmessage = (event) => {
       const data = JSON.parse(event.data);
+      if (data.type === 'pong') {
+        return;
+      }
+      if (data.type === 'reconnect') {
+        // Server is restarting; come back after its randomized delay
+        this.reconnectDelay = data.retry_after_ms;
+        return;
+      }
       if (this.onMessageCallback) {
         this.onMessageCallback(data);
       }
@@ -33,11 +52,12 @@ export class WebSocketService {
     this.socket.onclose = () => {
       console.log('WebSocket connection closed');
       this.isConnected = false;
+      clearInterval(this.heartbeat);
       
       // Attempt to reconnect after a delay
       setTimeout(() => {
         this.connect();
-      }, 5000);
+      }, this.reconnectDelay);
     };
     
     this.socket.onerror = (error) => {
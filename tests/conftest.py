@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+# Settings are read at import time, so point the app at a scratch database
+# and the fake LLM before anything from app is imported
+_data_dir = tempfile.mkdtemp(prefix="chat-api-tests-")
+os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{_data_dir}/test.db"
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["FAKE_LLM_LATENCY_MS"] = "0"
+os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = "0"
+
+import uuid
+
+import httpx
+import pytest
+
+from app.db.db import create_tables
+from app.db.sharding import shard_router
+from app.main import app
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    create_tables()
+    shard_router.create_tables()
+    # The app runs in the test's own task, so contextvars such as the query
+    # stats of assert_max_queries see the request's statements
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        yield http
+
+
+@pytest.fixture
+async def user(client):
+    """A fresh user; returns (user id, auth headers)."""
+    username = f"user-{uuid.uuid4().hex[:8]}"
+    response = await client.post("/api/v1/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "secret",
+    })
+    response.raise_for_status()
+    user_id = response.json()["id"]
+    response = await client.post("/api/v1/auth/token", data={"username": username, "password": "secret"})
+    response.raise_for_status()
+    return user_id, {"Authorization": f"Bearer {response.json()['access_token']}"}
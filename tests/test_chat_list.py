@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import event
+
+from app.dal.chat_dal import ChatDAL
+from app.db.sharding import shard_router
+from app.db.slow_query_log import explain
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_chat(client, headers, name):
+    response = await client.post("/api/v1/chats/create-chat", json={"name": name}, headers=headers)
+    return response.json()["id"]
+
+
+async def test_new_empty_chat_lists_first(client, user):
+    _, headers = user
+    older = await create_chat(client, headers, "older")
+    for content in ("one", "two"):
+        await client.post("/api/v1/messages/add-message", json={"chat_id": older, "content": content}, headers=headers)
+    await create_chat(client, headers, "empty")
+
+    response = await client.get("/api/v1/chats/list-chats", headers=headers)
+    assert [chat["name"] for chat in response.json()] == ["empty", "older"]
+    assert response.json()[0]["last_message_at"] is not None
+
+
+async def test_list_order_comes_from_the_index(user):
+    user_id, _ = user
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    with shard_router.session_for(user_id) as db:
+        db_engine = db.get_bind()
+        event.listen(db_engine, "before_cursor_execute", capture)
+        try:
+            await ChatDAL(db).get_all_chats(user_id)
+        finally:
+            event.remove(db_engine, "before_cursor_execute", capture)
+        statement, parameters = executed[-1]
+        plan = explain(db.connection(), statement, parameters)
+
+    assert "ix_chats_account_active_last_message" in plan
+    assert "TEMP B-TREE" not in plan
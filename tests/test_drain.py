@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.dal import message_dal
+from app.routes import messages
+from app.services.drain_service import INTERRUPTED_NOTE, DrainController
+from app.services.groq_service import GroqService
+
+pytestmark = pytest.mark.anyio
+
+
+def completion_chunk(content: str) -> bytes:
+    chunk = {
+        "id": "chatcmpl-test",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "llama-3.3-70b-versatile",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+async def test_drain_checkpoints_streaming_groq_generation(client, user, monkeypatch):
+    _, headers = user
+    response = await client.post("/api/v1/chats/create-chat", json={"name": "drain"}, headers=headers)
+    chat_id = response.json()["id"]
+
+    # A Groq stream that sends two chunks and then stalls mid-generation
+    streaming = asyncio.Event()
+
+    async def events():
+        yield completion_chunk("Partial ")
+        yield completion_chunk("answer")
+        streaming.set()
+        await asyncio.sleep(60)
+        yield b"data: [DONE]\n\n"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+    groq = GroqService(api_key="test", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    controller = DrainController(timeout=0.1, grace=5, reconnect_min_ms=1, reconnect_max_ms=2)
+    monkeypatch.setattr(message_dal, "get_llm_service", lambda: groq)
+    monkeypatch.setattr(message_dal, "drain_controller", controller)
+    monkeypatch.setattr(messages, "drain_controller", controller)
+
+    request = asyncio.create_task(client.post(
+        "/api/v1/messages/add-message", json={"chat_id": chat_id, "content": "question"}, headers=headers
+    ))
+    await asyncio.wait_for(streaming.wait(), 5)
+    await asyncio.wait_for(controller.drain(), 5)
+    response = await asyncio.wait_for(request, 5)
+
+    expected = f"Partial answer\n\n{INTERRUPTED_NOTE}"
+    assert response.status_code == 200
+    assert response.json()["response"] == expected
+
+    # The checkpointed reply is durable
+    response = await client.get("/api/v1/chats/get-chat-content", params={"chat_id": chat_id}, headers=headers)
+    assert [row["response"] for row in response.json()] == [None, expected]
+
+    # And no new work is accepted while draining
+    response = await client.post(
+        "/api/v1/messages/add-message", json={"chat_id": chat_id, "content": "again"}, headers=headers
+    )
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
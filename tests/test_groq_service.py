@@ -0,0 +1,19 @@
+import pytest
+
+from app.config import settings
+from app.services import groq_service
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_llm_client_is_shared_and_closed(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BACKEND", "groq")
+    monkeypatch.setattr(groq_service, "_llm_service", None)
+
+    service = groq_service.get_llm_service()
+    assert groq_service.get_llm_service() is service
+
+    await groq_service.close_llm_service()
+    assert service.client._client.is_closed
+    assert groq_service.get_llm_service() is not service
+    await groq_service.close_llm_service()
@@ -0,0 +1,30 @@
+import pytest
+
+from app.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_metrics_disabled_without_token(client):
+    response = await client.get("/metrics", headers={"Authorization": "Bearer anything"})
+    assert response.status_code == 404
+
+
+async def test_metrics_require_scrape_token(client, user, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    _, headers = user
+    response = await client.get("/metrics")
+    assert response.status_code == 401
+
+    # A user's login token is not the scrape token
+    response = await client.get("/metrics", headers=headers)
+    assert response.status_code == 401
+
+
+async def test_metrics_for_scraper(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    response = await client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    # A single unlabelled series, with no chat ids in the output
+    assert "\nwebsocket_connections 0\n" in response.text
+    assert "chat_id" not in response.text
@@ -0,0 +1,84 @@
+"""Statement-count bounds for read paths, so a new N+1 fails here."""
+import pytest
+
+from app.dal.branch_dal import BranchDAL
+from app.db.db import Message
+from app.db.query_stats import assert_max_queries
+from app.db.sharding import shard_router
+
+pytestmark = pytest.mark.anyio
+
+BRANCHES_PER_LEVEL = 3
+
+
+async def add_message(client, headers, chat_id: str, content: str) -> str:
+    response = await client.post("/api/v1/messages/add-message", json={"chat_id": chat_id, "content": content}, headers=headers)
+    response.raise_for_status()
+    return response.json()["response_id"]
+
+
+async def create_branch(client, headers, chat_id: str, message_id: str, name: str) -> str:
+    response = await client.post("/api/v1/branches/create-branch", json={
+        "parent_chat_id": chat_id, "parent_message_id": message_id, "name": name,
+    }, headers=headers)
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+@pytest.fixture
+async def chat_with_tree(client, user):
+    """A chat with a few messages and two levels of branches."""
+    user_id, headers = user
+    response = await client.post("/api/v1/chats/create-chat", json={"name": "root"}, headers=headers)
+    response.raise_for_status()
+    chat_id = response.json()["id"]
+
+    message_ids = [await add_message(client, headers, chat_id, f"question {index}") for index in range(4)]
+    for index in range(BRANCHES_PER_LEVEL):
+        branch_id = await create_branch(client, headers, chat_id, message_ids[index], f"branch {index}")
+        child_message = await add_message(client, headers, branch_id, "follow-up")
+        for child in range(BRANCHES_PER_LEVEL):
+            await create_branch(client, headers, branch_id, child_message, f"branch {index}.{child}")
+    return user_id, headers, chat_id
+
+
+async def test_branch_tree_is_one_query(chat_with_tree):
+    user_id, _, chat_id = chat_with_tree
+    with shard_router.session_for(user_id) as db:
+        # Access check plus the recursive CTE, however many branches there are
+        with assert_max_queries(2, "get_branch_tree"):
+            tree = await BranchDAL(db).get_branch_tree(chat_id, user_id)
+
+    assert len(tree["branches"]) == BRANCHES_PER_LEVEL
+    assert all(len(branch["branches"]) == BRANCHES_PER_LEVEL for branch in tree["branches"])
+
+
+async def test_message_rows_skip_branch_links(chat_with_tree):
+    user_id, _, chat_id = chat_with_tree
+    with shard_router.session_for(user_id) as db:
+        # As in add_message's history read: no message_branches query
+        with assert_max_queries(1, "Message rows"):
+            rows = db.query(Message).filter(Message.chat_id == chat_id).all()
+
+    assert len(rows) == 8
+
+
+async def test_get_branches_route(client, chat_with_tree):
+    _, headers, chat_id = chat_with_tree
+    # User, chat access check and one query joining the branch chats
+    with assert_max_queries(3, "GET /branches/{chat_id}"):
+        response = await client.get(f"/api/v1/branches/{chat_id}", headers=headers)
+
+    assert response.status_code == 200
+    assert len(response.json()) == BRANCHES_PER_LEVEL
+
+
+async def test_get_chat_content_route(client, chat_with_tree):
+    _, headers, chat_id = chat_with_tree
+    # User, chat, messages and their branch links
+    with assert_max_queries(4, "GET /chats/get-chat-content"):
+        response = await client.get("/api/v1/chats/get-chat-content", params={"chat_id": chat_id}, headers=headers)
+
+    assert response.status_code == 200
+    # A question and an answer row per turn
+    assert len(response.json()) == 8
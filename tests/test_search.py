@@ -0,0 +1,50 @@
+import pytest
+
+from app.config import settings
+
+pytestmark = pytest.mark.anyio
+
+FILLER = " lorem ipsum" * 200
+
+
+@pytest.fixture
+async def chat(client, user):
+    _, headers = user
+    response = await client.post("/api/v1/chats/create-chat", json={"name": "search"}, headers=headers)
+    chat_id = response.json()["id"]
+    questions = [
+        "growth was 50% this year",
+        "growth was 500 units",
+        "rename snake_case fields",
+        "rename snakeXcase fields",
+        "Café Menu",
+        # Long enough to be stored compressed
+        "Café Report" + FILLER,
+        "growth was 50% overall" + FILLER,
+    ]
+    for question in questions:
+        await client.post(
+            "/api/v1/messages/add-message", json={"chat_id": chat_id, "content": question}, headers=headers
+        )
+    return chat_id, headers
+
+
+async def search(client, chat, query):
+    chat_id, headers = chat
+    response = await client.get(
+        "/api/v1/messages/search", params={"chat_id": chat_id, "query": query}, headers=headers
+    )
+    assert response.status_code == 200
+    return sorted(row["question"][:20] for row in response.json() if row["question"])
+
+
+async def test_wildcards_match_literally(client, chat):
+    assert settings.MESSAGE_COMPRESSION_THRESHOLD < len(FILLER)
+    assert await search(client, chat, "50%") == ["growth was 50% overa", "growth was 50% this "]
+    assert await search(client, chat, "snake_case") == ["rename snake_case fi"]
+
+
+async def test_compressed_and_plain_bodies_match_alike(client, chat):
+    # SQLite's LIKE folds ASCII letters only
+    assert await search(client, chat, "CAFÉ") == []
+    assert await search(client, chat, "cAfé") == ["Café Menu", "Café Report lorem ip"]
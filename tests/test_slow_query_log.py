@@ -0,0 +1,21 @@
+import logging
+
+from sqlalchemy import create_engine
+
+from app.db.slow_query_log import SlowQueryLog
+
+
+def test_new_statement_is_kept_when_full(caplog):
+    log = SlowQueryLog(enabled=True, threshold=0.1, max_statements=2)
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection, caplog.at_level(logging.WARNING):
+        log.record(connection, "SELECT 1", (), False, 5.0, "a")
+        log.record(connection, "SELECT 2", (), False, 3.0, "b")
+        for _ in range(3):
+            log.record(connection, "SELECT 3", (), False, 0.5, "c")
+
+    statements = [entry["statement"] for entry in log.top(10)]
+    assert statements == ["SELECT 1", "SELECT 3"]
+    assert log.top(10)[1]["count"] == 3
+    # Explained and logged once, not on every call
+    assert sum("SELECT 3" in message for message in caplog.messages) == 1
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app.routes.websockets import ConnectionManager
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeSocket:
+    def __init__(self, stalled: bool = False, broken: bool = False):
+        self.stalled = stalled
+        self.broken = broken
+        self.sent = []
+        self.close_code = None
+
+    async def send_json(self, message):
+        if self.broken:
+            raise RuntimeError("socket is gone")
+        if self.stalled:
+            await asyncio.sleep(60)
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+async def register(manager: ConnectionManager, chat_id: str, socket: FakeSocket):
+    manager.active_connections.setdefault(chat_id, set()).add(socket)
+    manager.connection_count += 1
+
+
+async def test_broadcast_drops_and_closes_failed_sockets():
+    manager = ConnectionManager(max_connections=10, send_timeout=0.05)
+    healthy, stalled, broken = FakeSocket(), FakeSocket(stalled=True), FakeSocket(broken=True)
+    for socket in (healthy, stalled, broken):
+        await register(manager, "chat", socket)
+
+    await manager.broadcast("chat", {"type": "message"})
+
+    assert healthy.sent == [{"type": "message"}]
+    assert healthy.close_code is None
+    # Closed so the client reconnects, and no longer counted against the cap
+    assert stalled.close_code == broken.close_code == 1011
+    assert manager.active_connections == {"chat": {healthy}}
+    assert manager.connection_count == 1